@@ -1,7 +1,8 @@
 """Описание страницы администратора для приложения posts."""
 from django.contrib import admin
 
-from .models import Comment, Follow, Group, Post
+from .models import Comment, Follow, Group, Post, Task, UserStats
+from .search import search_post_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -12,6 +13,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищем посты по полнотекстовому индексу вместо LIKE."""
+        if not search_term:
+            return queryset, False
+        ids = search_post_ids(search_term, self.list_max_show_all)
+        return queryset.filter(pk__in=ids), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     """Описание полей модели Group для сайта администрирования."""
@@ -40,7 +48,27 @@ class FollowAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class UserStatsAdmin(admin.ModelAdmin):
+    """Описание полей модели UserStats для сайта администрирования."""
+
+    list_display = ('user', 'posts_count', 'followers_count',
+                    'following_count')
+    search_fields = ('user__username',)
+    readonly_fields = ('posts_count', 'followers_count', 'following_count')
+
+
+class TaskAdmin(admin.ModelAdmin):
+    """Описание полей модели Task для сайта администрирования."""
+
+    list_display = ('pk', 'name', 'run_at', 'attempts', 'failed')
+    search_fields = ('name',)
+    list_filter = ('failed', 'name')
+    readonly_fields = ('payload', 'attempts', 'last_error')
+
+
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Post, PostAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(UserStats, UserStatsAdmin)
+admin.site.register(Task, TaskAdmin)
@@ -0,0 +1,169 @@
+"""JSON API лент только для чтения."""
+import hashlib
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_safe
+from django.views.decorators.vary import vary_on_cookie
+
+from posts.cache import (
+    ALL_POSTS,
+    author_scope,
+    generations,
+    group_scope,
+    post_scope
+)
+from posts.models import Group, Post
+from posts.paginator import CursorPaginator
+from posts.replicas import use_replica
+from posts.timeline import TimelinePaginator
+from posts.usercache import get_user_or_404
+
+API_VERSION = '1'
+JSON_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+def make_etag(request, *scopes, private=False):
+    """
+    Сильный ETag ответа по поколениям данных и курсору.
+
+    Поколения берутся из кеша и меняются при любой правке постов,
+    комментариев и подписок, поэтому для ответа 304 строки постов
+    из базы не читаются. Для личных лент в ETag входит пользователь.
+
+    """
+    parts = [API_VERSION, request.path, request.GET.get('cursor', '')]
+    if private:
+        parts.append(str(request.user.pk))
+    parts.extend(str(value) for value in generations(*scopes))
+    return hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+
+def serialize_post(post):
+    """Компактное представление поста."""
+    return {
+        'id': post.id,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group else None,
+        'image': post.image.url if post.image else None,
+        'comments': post.comment_count,
+    }
+
+
+def serialize_comment(comment):
+    """Компактное представление комментария."""
+    return {
+        'id': comment.id,
+        'author': comment.author.username if comment.author else None,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def page_data(page, serializer):
+    """Страница пагинатора в виде словаря."""
+    return {'results': [serializer(obj) for obj in page],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor}
+
+
+def json_page(request, object_list, serializer, date_field='pub_date'):
+    """Страница выборки по курсору в виде словаря."""
+    page = CursorPaginator(object_list, date_field=date_field).get_page(
+        request.GET.get('cursor'))
+    return page_data(page, serializer)
+
+
+def json_response(data, **kwargs):
+    """JsonResponse в компактной записи."""
+    return JsonResponse(data, json_dumps_params=JSON_PARAMS, **kwargs)
+
+
+def index_etag(request):
+    """ETag ленты всех постов."""
+    return make_etag(request, ALL_POSTS)
+
+
+def group_etag(request, slug):
+    """ETag ленты группы."""
+    group = get_object_or_404(Group, slug=slug)
+    return make_etag(request, group_scope(group.id))
+
+
+def profile_etag(request, username):
+    """ETag ленты автора."""
+    author = get_user_or_404(username)
+    return make_etag(request, author_scope(author.id))
+
+
+def post_etag(request, username, post_id):
+    """ETag поста с комментариями."""
+    return make_etag(request, post_scope(post_id))
+
+
+def follow_etag(request):
+    """ETag ленты подписок: любые посты и подписки пользователя."""
+    if not request.user.is_authenticated:
+        return None
+    return make_etag(request, ALL_POSTS, author_scope(request.user.id),
+                     private=True)
+
+
+@require_safe
+@use_replica
+@condition(etag_func=index_etag)
+def index(request):
+    """Лента всех постов."""
+    return json_response(json_page(request, Post.objects.feed(),
+                                   serialize_post))
+
+
+@require_safe
+@use_replica
+@condition(etag_func=group_etag)
+def group_posts(request, slug):
+    """Лента группы."""
+    group = get_object_or_404(Group, slug=slug)
+    return json_response(json_page(request, group.group_posts.feed(),
+                                   serialize_post))
+
+
+@require_safe
+@use_replica
+@condition(etag_func=profile_etag)
+def profile(request, username):
+    """Лента автора."""
+    author = get_user_or_404(username)
+    return json_response(json_page(request, author.author_posts.feed(),
+                                   serialize_post))
+
+
+@require_safe
+@use_replica
+@condition(etag_func=post_etag)
+def post_view(request, username, post_id):
+    """Пост и страница его комментариев."""
+    post = get_object_or_404(Post.objects.feed(),
+                             author__username=username, id=post_id)
+    comments = post.post_comment.select_related('author')
+    return json_response({
+        'post': serialize_post(post),
+        'comments': json_page(request, comments, serialize_comment,
+                              date_field='created'),
+    })
+
+
+@require_safe
+@use_replica
+@vary_on_cookie
+@condition(etag_func=follow_etag)
+def follow_index(request):
+    """Лента подписок текущего пользователя."""
+    if not request.user.is_authenticated:
+        return json_response({'detail': 'Требуется авторизация.'},
+                             status=401)
+    page = TimelinePaginator(request.user).get_page(
+        request.GET.get('cursor'))
+    return json_response(page_data(page, serialize_post))
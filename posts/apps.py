@@ -12,3 +12,8 @@ class PostsConfig(AppConfig):
     """
 
     name = 'posts'
+
+    def ready(self):
+        """Подключаем обработчики сигналов и регистрируем задачи."""
+        import posts.signals  # noqa: F401
+        import posts.tasks  # noqa: F401
@@ -0,0 +1,196 @@
+"""Замеры времени ответа страниц и скорости бэкендов кеша."""
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, reverse
+
+from posts import urls as posts_urls
+from posts.models import Post
+from users import urls as users_urls
+from yatube.sqlitecache import SQLiteCache
+
+PERCENTILES = (50, 95, 99)
+# Бэкенд кеша, общий ли он для процессов, и имя хранилища в каталоге.
+CACHE_BACKENDS = (
+    ('locmem', LocMemCache, False, 'benchmark'),
+    ('filebased', FileBasedCache, True, 'files'),
+    ('sqlite', SQLiteCache, True, 'cache.sqlite3'),
+)
+# Способы загрузки сессии и пользователя: движок сессий и middleware.
+AUTH_SETUPS = (
+    ('db', 'django.contrib.sessions.backends.db',
+     'django.contrib.auth.middleware.AuthenticationMiddleware'),
+    ('cached', 'django.contrib.sessions.backends.cached_db',
+     'posts.middleware.CachedAuthenticationMiddleware'),
+)
+AUTH_ROUTES = ('follow_index', 'new_post')
+AUTH_MIDDLEWARE = {middleware for _, _, middleware in AUTH_SETUPS}
+# Маршруты, которые пишут в базу даже на GET; их замер откатывается.
+WRITE_ROUTES = ('profile_follow', 'profile_unfollow')
+
+
+def routes(*modules):
+    """Имена маршрутов и имена их параметров из модулей urls."""
+    for module in modules or (posts_urls, users_urls):
+        for pattern in module.urlpatterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                yield pattern.name, tuple(pattern.pattern.converters)
+
+
+def sample_kwargs():
+    """Значения параметров маршрутов по самому свежему посту с группой."""
+    post = (Post.objects.feed().filter(group__isnull=False).first()
+            or Post.objects.feed().first())
+    if post is None:
+        return None, {}
+    kwargs = {'username': post.author.username, 'post_id': post.pk}
+    if post.group is not None:
+        kwargs['slug'] = post.group.slug
+    return post.author, kwargs
+
+
+def percentiles(timings):
+    """Перцентили PERCENTILES в миллисекундах."""
+    if len(timings) < 2:
+        timings = timings * 2
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return {f'p{p}_ms': round(cuts[p - 1] * 1000, 3) for p in PERCENTILES}
+
+
+def measure(client, url, requests):
+    """
+    Прогнать url requests раз и собрать статистику.
+
+    Число запросов к базе дается для первого (холодного) и последнего
+    ответа, разница между ними показывает работу кеша.
+
+    """
+    timings, counts = [], []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - started)
+        counts.append(len(queries))
+    return {'url': url, 'status': response.status_code,
+            'queries_cold': counts[0], 'queries': counts[-1],
+            **percentiles(timings)}
+
+
+def run(requests=20, anonymous=False):
+    """
+    Замерить все маршруты posts и users через тестовый клиент.
+
+    Клиент авторизуется автором поста-образца, чтобы закрытые страницы
+    отвечали содержимым, а не редиректом. Маршруты без данных для
+    параметров пропускаются. Замер идет вне транзакции, чтобы кеш
+    заполнялся после фиксации, как в работе; только WRITE_ROUTES
+    замеряются в транзакции, которая затем откатывается.
+
+    """
+    author, kwargs = sample_kwargs()
+    client = Client()
+    if author is not None and not anonymous:
+        client.force_login(author)
+    results = {}
+    for name, params in routes():
+        if not set(params) <= set(kwargs):
+            continue
+        url = reverse(name, kwargs={key: kwargs[key] for key in params})
+        if name not in WRITE_ROUTES:
+            results[name] = measure(client, url, requests)
+            continue
+        with transaction.atomic():
+            results[name] = measure(client, url, requests)
+            transaction.set_rollback(True)
+    return {'requests': requests, 'anonymous': anonymous,
+            'routes': results}
+
+
+def run_auth(requests=20):
+    """
+    Сравнить загрузку сессии и пользователя из базы и из кеша.
+
+    Для каждого способа из AUTH_SETUPS новый клиент входит автором
+    поста-образца и открывает страницы AUTH_ROUTES; разница в числе
+    запросов - это чтения django_session и auth_user. Замер идет вне
+    транзакции: кеш пользователя пишется только после фиксации, а
+    страницы AUTH_ROUTES ничего не меняют. Сессии удаляются выходом.
+
+    """
+    author, _ = sample_kwargs()
+    if author is None:
+        return {'requests': requests, 'setups': {}}
+    results = {}
+    for name, engine, middleware in AUTH_SETUPS:
+        stack = [middleware if item in AUTH_MIDDLEWARE else item
+                 for item in settings.MIDDLEWARE]
+        with override_settings(SESSION_ENGINE=engine, MIDDLEWARE=stack):
+            client = Client()
+            client.force_login(author)
+            results[name] = {route: measure(client, reverse(route), requests)
+                             for route in AUTH_ROUTES}
+            client.logout()
+    return {'requests': requests, 'setups': results}
+
+
+def cache_operations(cache, keys, value):
+    """Секунды на запись, попадание, промах и пакетное чтение."""
+    timings = {}
+    started = time.perf_counter()
+    for key in keys:
+        cache.set(key, value)
+    timings['set'] = time.perf_counter() - started
+    started = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    timings['get_hit'] = time.perf_counter() - started
+    started = time.perf_counter()
+    for key in keys:
+        cache.get(f'{key}:missing')
+    timings['get_miss'] = time.perf_counter() - started
+    started = time.perf_counter()
+    for start in range(0, len(keys), 10):
+        cache.get_many(keys[start:start + 10])
+    timings['get_many_10'] = time.perf_counter() - started
+    return timings
+
+
+def run_cache(operations=2000, value_size=4096):
+    """
+    Сравнить LocMemCache, FileBasedCache и SQLiteCache.
+
+    Для каждой операции дается число операций в секунду; значение
+    размером value_size байт похоже на фрагмент ленты.
+
+    """
+    directory = tempfile.mkdtemp()
+    keys = [f'fragment:{index}' for index in range(operations)]
+    value = os.urandom(value_size // 2).hex()
+    results = {}
+    try:
+        for name, backend, shared, location in CACHE_BACKENDS:
+            cache = backend(os.path.join(directory, location),
+                            {'OPTIONS': {'MAX_ENTRIES': operations * 2}})
+            timings = cache_operations(cache, keys, value)
+            calls = {'get_many_10': -(-operations // 10)}
+            results[name] = {
+                'shared_between_processes': shared,
+                **{f'{operation}_per_s': round(
+                    calls.get(operation, operations) / seconds)
+                   for operation, seconds in timings.items()},
+            }
+            cache.clear()
+    finally:
+        shutil.rmtree(directory)
+    return {'operations': operations, 'value_size': value_size,
+            'backends': results}
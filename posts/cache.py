@@ -0,0 +1,85 @@
+"""Версионирование кеша страниц по поколениям данных."""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Фрагменты сбрасываются сменой поколения, поэтому могут жить долго.
+CACHE_TIMEOUT = getattr(settings, 'POSTS_CACHE_TIMEOUT', 60 * 60 * 6)
+GENERATION_PREFIX = 'posts:generation:'
+PAGE_PREFIX = 'posts:page:'
+# Сколько секунд обратный прокси и браузер могут не перепроверять
+# страницу для анонимов; после этого они спрашивают ее по ETag.
+PAGE_MAX_AGE = getattr(settings, 'POSTS_PAGE_MAX_AGE', 10)
+
+ALL_POSTS = 'posts'
+
+
+def group_scope(group_id):
+    """Поколение страницы группы."""
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    """Поколение страницы профиля автора."""
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    """Поколение страницы поста."""
+    return f'post:{post_id}'
+
+
+def _new_generation():
+    """Начальное поколение, не совпадающее с вытесненным из кеша."""
+    return time.time_ns()
+
+
+def generations(*scopes):
+    """Текущие поколения областей в порядке scopes."""
+    keys = [GENERATION_PREFIX + scope for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _new_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сменить поколения областей, сделав их кеш недействительным."""
+    for scope in set(scopes):
+        key = GENERATION_PREFIX + scope
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), None)
+
+
+def cache_context(*scopes):
+    """Версия и время жизни кеша для тега {% cache %} в шаблоне."""
+    version = '.'.join(str(value) for value in generations(*scopes))
+    return {'cache_version': version, 'cache_timeout': CACHE_TIMEOUT}
+
+
+def page_etag(full_path, *scopes):
+    """ETag страницы: адрес с параметрами и поколения ее областей."""
+    parts = [full_path, *(str(value) for value in generations(*scopes))]
+    return hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+
+def cache_anonymous(scopes):
+    """
+    Декоратор view: целые ответы анонимам кешируются.
+
+    Кешированием занимается posts.middleware.AnonymousPageCacheMiddleware.
+    scopes(request, *args, **kwargs) получает аргументы view и
+    возвращает области кеша страницы или None, если страница не
+    кешируется. Декоратор ставится последним, поверх остальных.
+
+    """
+    def decorator(view):
+        view.page_cache_scopes = scopes
+        return view
+    return decorator
@@ -0,0 +1,79 @@
+"""Денормализованные счетчики постов и пользователей."""
+from django.apps import apps as django_apps
+from django.db import models
+from django.db.models.functions import Coalesce
+
+USER_COUNTERS = ('posts_count', 'followers_count', 'following_count')
+
+
+def change_comment_count(post_id, delta):
+    """Изменить число комментариев поста на delta."""
+    post_model = django_apps.get_model('posts', 'Post')
+    post_model.objects.filter(pk=post_id).update(
+        comment_count=models.F('comment_count') + delta)
+
+
+def change_user_stats(user_id, **deltas):
+    """Изменить счетчики пользователя на заданные величины."""
+    stats_model = django_apps.get_model('posts', 'UserStats')
+    stats_model.objects.filter(user_id=user_id).update(**{
+        name: models.F(name) + delta for name, delta in deltas.items()})
+
+
+def _count(model, field, outer='pk'):
+    """Подзапрос числа строк model, ссылающихся на внешнюю запись."""
+    rows = model.objects.filter(**{field: models.OuterRef(outer)}).order_by()
+    rows = rows.values(field).annotate(total=models.Count('pk'))
+    return Coalesce(models.Subquery(rows.values('total')), 0)
+
+
+def expected_counters(apps=django_apps):
+    """Выражения для пересчета счетчиков постов и пользователей."""
+    post_model = apps.get_model('posts', 'Post')
+    comment_model = apps.get_model('posts', 'Comment')
+    follow_model = apps.get_model('posts', 'Follow')
+    return (
+        {'comment_count': _count(comment_model, 'post')},
+        {'posts_count': _count(post_model, 'author', 'user'),
+         'followers_count': _count(follow_model, 'author', 'user'),
+         'following_count': _count(follow_model, 'user', 'user')},
+    )
+
+
+def count_drift(apps=django_apps):
+    """Число постов и счетчиков пользователей, разошедшихся с данными."""
+    post_model = apps.get_model('posts', 'Post')
+    stats_model = apps.get_model('posts', 'UserStats')
+    post_counters, user_counters = expected_counters(apps)
+
+    posts = post_model.objects.annotate(
+        expected=post_counters['comment_count']).exclude(
+        comment_count=models.F('expected')).count()
+
+    stats = stats_model.objects.annotate(**{
+        f'expected_{name}': expr for name, expr in user_counters.items()})
+    in_sync = models.Q()
+    for name in USER_COUNTERS:
+        in_sync &= models.Q(**{name: models.F(f'expected_{name}')})
+    return posts, stats.exclude(in_sync).count()
+
+
+def rebuild_counters(apps=django_apps):
+    """
+    Пересчитать все счетчики массовыми UPDATE.
+
+    Принимает реестр моделей, поэтому используется и в миграциях.
+
+    """
+    post_model = apps.get_model('posts', 'Post')
+    stats_model = apps.get_model('posts', 'UserStats')
+    user_model = stats_model._meta.get_field('user').related_model
+    post_counters, user_counters = expected_counters(apps)
+
+    missing = list(user_model.objects.filter(
+        stats__isnull=True).values_list('pk', flat=True))
+    stats_model.objects.bulk_create(
+        [stats_model(user_id=pk) for pk in missing], batch_size=500)
+
+    post_model.objects.update(**post_counters)
+    stats_model.objects.update(**user_counters)
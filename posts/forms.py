@@ -1,6 +1,15 @@
 """Формы приложения posts."""
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 
+from posts.images import (
+    delete_files,
+    derivative_names,
+    normalize,
+    save_derivatives,
+    stored_original
+)
 from posts.models import Comment, Post
 
 
@@ -13,6 +22,58 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image')
 
+    normalized_image = None
+
+    def clean_image(self):
+        """Нормализуем новую картинку: без EXIF, ограниченного размера."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            try:
+                self.normalized_image = normalize(image)
+            except (OSError, ValueError):
+                raise forms.ValidationError('Не удалось обработать картинку.')
+            image = stored_original(self.normalized_image, image.name)
+        return image
+
+    def save(self, commit=True):
+        """Сохраняем производные новой картинки вместе с постом."""
+        post = super().save(commit=False)
+        replaced = []
+        if self.normalized_image is not None or not post.image:
+            replaced = derivative_names(post.image_derivatives)
+        if self.normalized_image is not None:
+            post.image_width, post.image_height = self.normalized_image.size
+            post.image_derivatives = save_derivatives(
+                self.normalized_image, post.image.name, post.image.storage)
+        elif not post.image:
+            post.image_width = post.image_height = None
+            post.image_derivatives = ''
+        if commit:
+            self.save_with_files(post, replaced)
+        return post
+
+    def save_with_files(self, post, replaced):
+        """
+        Сохранить пост и убрать ставшие ненужными файлы производных.
+
+        Прежние производные удаляются после фиксации транзакции, новые -
+        сразу, если пост сохранить не удалось.
+
+        """
+        storage = post.image.storage
+        created = []
+        if self.normalized_image is not None:
+            created = derivative_names(post.image_derivatives)
+        try:
+            with transaction.atomic():
+                post.save()
+                self._save_m2m()
+        except Exception:
+            delete_files(created, storage)
+            raise
+        if replaced:
+            transaction.on_commit(lambda: delete_files(replaced, storage))
+
 
 class CommentForm(forms.ModelForm):
     """Форма создания и редактирования комментария."""
@@ -0,0 +1,73 @@
+"""
+Дырявый кеш: общие части страницы и вставки для конкретного читателя.
+
+Страница или ее фрагменты кешируются один раз для всех читателей, а
+места, зависящие от читателя, отрисовываются тегом {% hole %} как
+метки-комментарии. После отрисовки render заменяет метки на HTML,
+собранный функциями, зарегистрированными декоратором hole.
+"""
+import re
+from urllib.parse import quote, unquote
+
+from django import shortcuts
+from django.template.loader import render_to_string
+
+from posts.models import Follow
+
+HOLES = {}
+HOLE_RE = re.compile(r'<!--hole:(\w+)((?::[^:\s>]*)*)-->')
+
+
+def hole(func):
+    """Зарегистрировать функцию вставки под ее именем."""
+    HOLES[func.__name__] = func
+    return func
+
+
+def placeholder(name, *args):
+    """Метка вставки с аргументами, пригодная для кеширования."""
+    if name not in HOLES:
+        raise KeyError(f'Неизвестная вставка: {name}')
+    return ''.join([f'<!--hole:{name}',
+                    *(':' + quote(str(arg), safe='') for arg in args),
+                    '-->'])
+
+
+def fill_holes(request, content):
+    """Заменить метки вставками для пользователя запроса."""
+    filled = {}
+
+    def fill(match):
+        if match.group(0) not in filled:
+            args = [unquote(arg) for arg in match.group(2).split(':')[1:]]
+            filled[match.group(0)] = HOLES[match.group(1)](request, *args)
+        return filled[match.group(0)]
+    return HOLE_RE.sub(fill, content)
+
+
+def render(request, template_name, context=None, status=None):
+    """Как django.shortcuts.render, но с заполнением вставок."""
+    response = shortcuts.render(request, template_name, context,
+                                status=status)
+    response.content = fill_holes(request,
+                                  response.content.decode(response.charset))
+    return response
+
+
+@hole
+def edit_link(request, author_id, username, post_id):
+    """Ссылка на редактирование поста, видна только автору."""
+    if request.user.pk != int(author_id):
+        return ''
+    return render_to_string('holes/edit_link.html',
+                            {'username': username, 'post_id': post_id})
+
+
+@hole
+def follow_button(request, author_id, username):
+    """Кнопка подписки на автора или отписки от него."""
+    is_follow = (request.user.is_authenticated
+                 and Follow.objects.filter(author_id=author_id,
+                                           user=request.user).exists())
+    return render_to_string('holes/follow_button.html',
+                            {'username': username, 'is_follow': is_follow})
@@ -0,0 +1,77 @@
+"""Нормализация загруженных картинок и подготовка производных."""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from PIL import Image, ImageOps
+
+# Наибольшая сторона хранимого оригинала.
+IMAGE_MAX_SIDE = getattr(settings, 'IMAGE_MAX_SIDE', 2048)
+# Размеры карточки поста для srcset, первый из них основной.
+CARD_SIZES = ((960, 339), (480, 170))
+FORMATS = {
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+DERIVATIVES_DIR = 'posts/derivatives'
+
+
+def normalize(upload):
+    """
+    Открыть загруженную картинку и привести ее к хранимому виду.
+
+    Поворот из EXIF применяется к пикселям, сами метаданные не
+    сохраняются, размер ограничивается IMAGE_MAX_SIDE.
+
+    """
+    upload.seek(0)
+    with Image.open(upload) as source:
+        image = ImageOps.exif_transpose(source).convert('RGB')
+    image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+    return image
+
+
+def encode(image, extension):
+    """Закодировать картинку в формат по расширению."""
+    image_format, options = FORMATS[extension]
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def stored_original(image, name):
+    """Файл оригинала в прогрессивном JPEG для поля image."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return ContentFile(encode(image, 'jpg'), name=f'{stem}.jpg')
+
+
+def save_derivatives(image, name, storage):
+    """
+    Сохранить карточки всех размеров в JPEG и WebP.
+
+    Возвращает строки «имя ширина» для поля Post.image_derivatives.
+
+    """
+    stem = os.path.splitext(os.path.basename(name))[0]
+    lines = []
+    for width, height in CARD_SIZES:
+        card = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        for extension in FORMATS:
+            saved = storage.save(
+                f'{DERIVATIVES_DIR}/{stem}_{width}x{height}.{extension}',
+                ContentFile(encode(card, extension)))
+            lines.append(f'{saved} {width}')
+    return '\n'.join(lines)
+
+
+def derivative_names(derivatives):
+    """Имена файлов из значения поля Post.image_derivatives."""
+    return [line.rsplit(' ', 1)[0] for line in derivatives.splitlines()]
+
+
+def delete_files(names, storage):
+    """Удалить файлы из хранилища."""
+    for name in names:
+        storage.delete(name)
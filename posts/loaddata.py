@@ -0,0 +1,100 @@
+"""Генерация синтетических данных для нагрузочных замеров."""
+import random
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from PIL import Image
+from posts.counters import rebuild_counters
+from posts.images import encode, save_derivatives
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import rebuild_index
+from posts.timeline import rebuild_timelines
+
+WORDS = ('джедай', 'ситх', 'меч', 'сила', 'корабль', 'планета', 'звезда',
+         'империя', 'повстанцы', 'дроид', 'пилот', 'база', 'флот', 'мир',
+         'война', 'свет', 'тьма', 'учитель', 'ученик', 'галактика')
+
+
+def sentence(rng, words):
+    """Случайный текст из words слов."""
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def make_image(rng, index):
+    """Сохранить небольшую случайную картинку и ее производные."""
+    color = tuple(rng.randrange(256) for _ in range(3))
+    image = Image.new('RGB', (1200, 800), color)
+    name = default_storage.save(f'posts/load_{index}.jpg',
+                                ContentFile(encode(image, 'jpg')))
+    return name, image.size, save_derivatives(image, name, default_storage)
+
+
+def power_law_authors(rng, users, count, exponent):
+    """Авторы для count подписок с популярностью по степенному закону."""
+    weights = [1 / (rank + 1) ** exponent for rank in range(len(users))]
+    return rng.choices(users, weights=weights, k=count)
+
+
+def generate(users, groups, posts, comments, follows, images, seed=0,
+             exponent=1.2):
+    """
+    Создать пользователей, группы, посты, комментарии и подписки.
+
+    Данные вставляются через bulk_create пакетами, которые выбирает сам
+    Django, затем пересчитываются счетчики, ленты и поисковый индекс.
+
+    """
+    rng = random.Random(seed)
+    prefix = f'load{seed}'
+    with transaction.atomic():
+        new_users = [User(username=f'{prefix}_user{i}') for i in range(users)]
+        for user in new_users:
+            user.set_unusable_password()
+        User.objects.bulk_create(new_users)
+        user_ids = list(User.objects.filter(
+            username__startswith=f'{prefix}_user').values_list(
+            'pk', flat=True))
+
+        Group.objects.bulk_create(
+            (Group(title=f'Группа {i}', slug=f'{prefix}-group-{i}',
+                   description=sentence(rng, 12)) for i in range(groups)))
+        group_ids = list(Group.objects.filter(
+            slug__startswith=f'{prefix}-group-').values_list('pk', flat=True))
+
+        new_posts = []
+        for i in range(posts):
+            post = Post(text=sentence(rng, rng.randint(5, 60)),
+                        author_id=rng.choice(user_ids),
+                        group_id=rng.choice(group_ids + [None]))
+            if i < images:
+                post.image, size, post.image_derivatives = make_image(rng, i)
+                post.image_width, post.image_height = size
+            new_posts.append(post)
+        Post.objects.bulk_create(new_posts)
+        post_ids = list(Post.objects.filter(
+            author_id__in=user_ids).values_list('pk', flat=True))
+
+        Comment.objects.bulk_create(
+            (Comment(post_id=rng.choice(post_ids),
+                     author_id=rng.choice(user_ids),
+                     text=sentence(rng, rng.randint(3, 20)))
+             for _ in range(comments if post_ids else 0)))
+
+        pairs = set()
+        popular = power_law_authors(rng, user_ids, follows, exponent)
+        for author_id in popular:
+            user_id = rng.choice(user_ids)
+            if user_id != author_id:
+                pairs.add((user_id, author_id))
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs), ignore_conflicts=True)
+
+        rebuild_counters()
+        rebuild_timelines()
+        rebuild_index()
+    return {'users': len(user_ids), 'groups': len(group_ids),
+            'posts': len(post_ids), 'comments': comments if post_ids else 0,
+            'follows': len(pairs)}
@@ -0,0 +1 @@
+"""__init.py."""
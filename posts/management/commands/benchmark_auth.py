@@ -0,0 +1,34 @@
+"""Команда сравнения загрузки вошедшего пользователя."""
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts.benchmark import run_auth
+
+
+class Command(BaseCommand):
+    """Замер сессий в базе против сессий и пользователя в кеше."""
+
+    help = ('Сравнивает число запросов и время ответа follow_index и '
+            'new_post с сессией в базе и с сессией и пользователем в '
+            'кеше и пишет результат в JSON.')
+
+    def add_arguments(self, parser):
+        """Описываем аргументы команды."""
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Сколько раз запрашивать каждую страницу.')
+        parser.add_argument('--output', help='Файл для отчета в JSON.')
+
+    def handle(self, *args, **options):
+        """Запускаем замер и печатаем таблицу."""
+        report = run_auth(options['requests'])
+        for name, routes in report['setups'].items():
+            for route, row in routes.items():
+                self.stdout.write(
+                    f'{name:7} {route:13} запросов {row["queries"]:3} '
+                    f'(холодный {row["queries_cold"]:3}) '
+                    f'p50 {row["p50_ms"]} мс p95 {row["p95_ms"]} мс')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2,
+                          sort_keys=True)
@@ -0,0 +1,36 @@
+"""Команда сравнения бэкендов кеша."""
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts.benchmark import run_cache
+
+
+class Command(BaseCommand):
+    """Замер скорости LocMemCache, FileBasedCache и SQLiteCache."""
+
+    help = ('Сравнивает запись и чтение в LocMemCache, FileBasedCache и '
+            'общем кеше SQLite и пишет результат в JSON.')
+
+    def add_arguments(self, parser):
+        """Описываем аргументы команды."""
+        parser.add_argument('--operations', type=int, default=2000,
+                            help='Сколько ключей писать и читать.')
+        parser.add_argument('--value-size', type=int, default=4096,
+                            help='Размер значения в байтах.')
+        parser.add_argument('--output', help='Файл для отчета в JSON.')
+
+    def handle(self, *args, **options):
+        """Запускаем замер и печатаем таблицу."""
+        report = run_cache(options['operations'], options['value_size'])
+        for name, row in report['backends'].items():
+            rates = ' '.join(f'{key[:-6]} {value}/с'
+                             for key, value in row.items()
+                             if key.endswith('_per_s'))
+            shared = 'общий' if row['shared_between_processes'] else (
+                'на процесс')
+            self.stdout.write(f'{name:10} {shared:10} {rates}')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2,
+                          sort_keys=True)
@@ -0,0 +1,35 @@
+"""Команда замера времени ответа всех страниц."""
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts.benchmark import run
+
+
+class Command(BaseCommand):
+    """Замер перцентилей времени ответа и числа запросов к базе."""
+
+    help = ('Прогоняет все страницы posts и users тестовым клиентом и '
+            'пишет p50/p95/p99 и число запросов в JSON.')
+
+    def add_arguments(self, parser):
+        """Описываем аргументы команды."""
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Сколько раз запрашивать каждую страницу.')
+        parser.add_argument('--anonymous', action='store_true',
+                            help='Запрашивать страницы без авторизации.')
+        parser.add_argument('--output', help='Файл для отчета в JSON.')
+
+    def handle(self, *args, **options):
+        """Запускаем замер и печатаем таблицу."""
+        report = run(options['requests'], options['anonymous'])
+        for name, row in report['routes'].items():
+            self.stdout.write(
+                f'{name:20} {row["status"]} '
+                f'{row["queries_cold"]:3}/{row["queries"]:<3} запр. '
+                f'p50 {row["p50_ms"]:8.2f} p95 {row["p95_ms"]:8.2f} '
+                f'p99 {row["p99_ms"]:8.2f} мс')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2,
+                          sort_keys=True)
@@ -0,0 +1,47 @@
+"""Команда потоковой выгрузки групп, постов, комментариев и подписок."""
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import (
+    copy_to_dir,
+    export_rows,
+    image_names,
+    throughput,
+    to_line
+)
+
+
+class Command(BaseCommand):
+    """Выгрузка данных постов в JSONL."""
+
+    help = 'Выгружает группы, посты, комментарии и подписки в JSONL.'
+
+    def add_arguments(self, parser):
+        """Описываем аргументы команды."""
+        parser.add_argument('path', help='Файл JSONL или - для stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Сколько строк читать из базы за раз.')
+        parser.add_argument('--media-dir',
+                            help='Скопировать картинки постов в каталог.')
+
+    def handle(self, *args, **options):
+        """Пишем строки по мере чтения из базы."""
+        if options['path'] == '-':
+            output = sys.stdout
+        else:
+            output = open(options['path'], 'w', encoding='utf-8')
+        counts = {}
+        started = time.monotonic()
+        try:
+            for label, row in export_rows(options['chunk_size']):
+                output.write(to_line(label, row) + '\n')
+                counts[label] = counts.get(label, 0) + 1
+                if label == 'post' and options['media_dir']:
+                    copy_to_dir(image_names(row), options['media_dir'])
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        for line in throughput(counts, time.monotonic() - started):
+            self.stderr.write(line)
@@ -0,0 +1,38 @@
+"""Команда генерации синтетических данных для нагрузочных замеров."""
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.loaddata import generate
+
+
+class Command(BaseCommand):
+    """Генерация пользователей, групп, постов, комментариев и подписок."""
+
+    help = ('Создает синтетических пользователей, группы, посты с '
+            'картинками, комментарии и подписки со степенным '
+            'распределением популярности авторов.')
+
+    def add_arguments(self, parser):
+        """Описываем аргументы команды."""
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument('--images', type=int, default=50,
+                            help='Сколько первых постов снабдить картинкой.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора и префикс имен.')
+
+    def handle(self, *args, **options):
+        """Создаем данные и печатаем итог."""
+        started = time.monotonic()
+        counts = generate(options['users'], options['groups'],
+                          options['posts'], options['comments'],
+                          options['follows'], options['images'],
+                          seed=options['seed'])
+        summary = ', '.join(f'{label}: {count}'
+                            for label, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'{summary} за {time.monotonic() - started:.1f} с.'))
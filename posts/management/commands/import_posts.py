@@ -0,0 +1,56 @@
+"""Команда потоковой загрузки групп, постов, комментариев и подписок."""
+import sys
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts.counters import rebuild_counters
+from posts.search import rebuild_index
+from posts.timeline import rebuild_timelines
+from posts.transfer import Importer, throughput
+
+
+class Command(BaseCommand):
+    """Загрузка данных постов из JSONL пакетами bulk_create."""
+
+    help = 'Загружает группы, посты, комментарии и подписки из JSONL.'
+
+    def add_arguments(self, parser):
+        """Описываем аргументы команды."""
+        parser.add_argument('path', help='Файл JSONL или - для stdin.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Сколько строк вставлять одной транзакцией.')
+        parser.add_argument('--media-dir',
+                            help='Каталог, откуда копировать картинки.')
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help='Не пересчитывать счетчики, ленты и индекс.')
+
+    def handle(self, *args, **options):
+        """Читаем файл построчно и вставляем строки пакетами."""
+        importer = Importer(options['batch_size'], options['media_dir'])
+        if options['path'] == '-':
+            source = sys.stdin
+        else:
+            source = open(options['path'], encoding='utf-8')
+        started = time.monotonic()
+        try:
+            for line in source:
+                if line.strip():
+                    importer.add(line)
+            importer.finish()
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        for line in throughput(importer.counts, time.monotonic() - started):
+            self.stderr.write(line)
+
+        # bulk_create не отправляет сигналы, поэтому производные данные
+        # пересчитываются целиком.
+        if not options['skip_rebuild']:
+            rebuild_counters()
+            rebuild_timelines()
+            rebuild_index()
+            cache.clear()
+            self.stderr.write('Счетчики, ленты и поисковый индекс '
+                              'пересобраны.')
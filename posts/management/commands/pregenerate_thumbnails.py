@@ -0,0 +1,35 @@
+"""Команда подготовки миниатюр для уже загруженных картинок."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_in_thread
+
+
+class Command(BaseCommand):
+    """Параллельная генерация миниатюр картинок постов."""
+
+    help = ('Генерирует миниатюры для картинок существующих постов '
+            'без производных.')
+
+    def add_arguments(self, parser):
+        """Описываем аргументы команды."""
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число параллельных потоков.')
+
+    def handle(self, *args, **options):
+        """Генерируем миниатюры в пуле потоков."""
+        # Посты с производными картинки миниатюры sorl не используют.
+        names = (Post.objects.exclude(image='').exclude(image__isnull=True)
+                 .filter(image_derivatives='')
+                 .values_list('image', flat=True).distinct())
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = list(executor.map(generate_in_thread, list(names)))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок: {len(results)}, с ошибками: {results.count(False)}, '
+            f'за {elapsed:.1f} с.'))
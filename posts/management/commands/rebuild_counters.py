@@ -0,0 +1,27 @@
+"""Команда пересчета денормализованных счетчиков."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import count_drift, rebuild_counters
+
+
+class Command(BaseCommand):
+    """Сверка и пересчет счетчиков комментариев, постов и подписок."""
+
+    help = 'Пересчитывает счетчики комментариев, постов и подписок.'
+
+    def add_arguments(self, parser):
+        """Описываем аргументы команды."""
+        parser.add_argument('--check', action='store_true',
+                            help='Только показать число расхождений.')
+
+    def handle(self, *args, **options):
+        """Сверяем счетчики и при необходимости пересчитываем их."""
+        posts, users = count_drift()
+        self.stdout.write(f'Расхождений: постов {posts}, '
+                          f'пользователей {users}.')
+        if options['check']:
+            return
+        with transaction.atomic():
+            rebuild_counters()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны.'))
@@ -0,0 +1,18 @@
+"""Команда пересборки поискового индекса."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.search import backend, rebuild_index
+
+
+class Command(BaseCommand):
+    """Пересборка полнотекстового индекса постов и комментариев."""
+
+    help = 'Заново индексирует тексты постов и комментариев для поиска.'
+
+    def handle(self, *args, **options):
+        """Индексируем все тексты заново."""
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс пересобран ({backend()}).'))
@@ -0,0 +1,20 @@
+"""Команда пересборки лент подписок."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import TimelineEntry
+from posts.timeline import rebuild_timelines
+
+
+class Command(BaseCommand):
+    """Пересборка материализованных лент подписок."""
+
+    help = 'Заново заполняет ленты подписок по существующим подпискам.'
+
+    def handle(self, *args, **options):
+        """Очищаем ленты и раскладываем посты заново."""
+        with transaction.atomic():
+            TimelineEntry.objects.all().delete()
+            rebuild_timelines()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}.'))
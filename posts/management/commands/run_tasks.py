@@ -0,0 +1,41 @@
+"""Команда воркера очереди фоновых задач."""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts.queue import run_pending
+
+
+class Command(BaseCommand):
+    """Воркер, выполняющий задачи из таблицы posts_task."""
+
+    help = 'Выполняет фоновые задачи из очереди в базе данных.'
+
+    def add_arguments(self, parser):
+        """Описываем аргументы команды."""
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Сколько задач забирать за раз.')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Пауза в секундах, когда очередь пуста.')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти.')
+
+    def handle(self, *args, **options):
+        """Забираем и выполняем задачи, пока не остановят."""
+        total_done = total_failed = 0
+        try:
+            while True:
+                close_old_connections()
+                done, failed = run_pending(options['batch_size'])
+                total_done += done
+                total_failed += failed
+                if done or failed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {total_done}, с ошибкой: {total_failed}.'))
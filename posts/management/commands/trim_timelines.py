@@ -0,0 +1,16 @@
+"""Команда обрезки лент подписок."""
+from django.core.management.base import BaseCommand
+
+from posts.timeline import TIMELINE_LENGTH, trim_timelines
+
+
+class Command(BaseCommand):
+    """Периодическая обрезка материализованных лент подписок."""
+
+    help = (f'Оставляет в каждой ленте подписок последние {TIMELINE_LENGTH} '
+            f'записей; запускается по расписанию.')
+
+    def handle(self, *args, **options):
+        """Обрезаем ленты, которые выросли сверх TIMELINE_LENGTH."""
+        self.stdout.write(self.style.SUCCESS(
+            f'Обрезано лент: {trim_timelines()}.'))
@@ -0,0 +1,239 @@
+"""Сбор метрик запросов: время, база, кеш и шаблоны."""
+import contextvars
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.module_loading import import_string
+
+# Запросы дольше этого порога попадают в кольцевой буфер вместе с SQL.
+SLOW_REQUEST_SECONDS = getattr(settings, 'POSTS_SLOW_REQUEST_SECONDS', 0.5)
+SLOW_REQUESTS_KEPT = getattr(settings, 'POSTS_SLOW_REQUESTS_KEPT', 50)
+SLOW_QUERIES_KEPT = 100
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+current = contextvars.ContextVar('posts_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счетчики одного запроса."""
+
+    def __init__(self):
+        """Начинаем отсчет."""
+        self.started = time.perf_counter()
+        self.queries = []
+        self.db_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Обертка execute_wrapper: считаем запросы и их время."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_seconds += duration
+            self.queries.append((sql, duration))
+
+
+def cache_result(hits, misses):
+    """Учесть попадания и промахи кеша в текущем запросе."""
+    metrics = current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class Histogram:
+    """Гистограмма в духе Prometheus с накопленными корзинами."""
+
+    def __init__(self, buckets):
+        """Пустая гистограмма."""
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Учесть значение."""
+        self.total += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def lines(self, name, labels):
+        """Строки текстового формата Prometheus."""
+        for bound, count in zip(self.buckets, self.counts):
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.total}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.total}'
+
+
+HISTOGRAMS = (
+    ('yatube_request_duration_seconds', 'Время ответа.', SECONDS_BUCKETS),
+    ('yatube_db_queries', 'Число запросов к базе.', COUNT_BUCKETS),
+    ('yatube_db_duration_seconds', 'Время запросов к базе.',
+     SECONDS_BUCKETS),
+    ('yatube_template_duration_seconds', 'Время отрисовки шаблонов.',
+     SECONDS_BUCKETS),
+)
+COUNTERS = (
+    ('yatube_cache_hits_total', 'Попадания в кеш.'),
+    ('yatube_cache_misses_total', 'Промахи кеша.'),
+)
+
+
+class Registry:
+    """Накопленные по view метрики и буфер медленных запросов."""
+
+    def __init__(self):
+        """Пустой реестр."""
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Сбросить все накопленное."""
+        self.histograms = {}
+        self.counters = {}
+        self.slow = deque(maxlen=SLOW_REQUESTS_KEPT)
+
+    def record(self, request, response, metrics):
+        """Учесть завершенный запрос."""
+        duration = time.perf_counter() - metrics.started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        values = (duration, len(metrics.queries), metrics.db_seconds,
+                  metrics.template_seconds)
+        with self.lock:
+            for (name, _, buckets), value in zip(HISTOGRAMS, values):
+                key = (name, view)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(buckets)
+                self.histograms[key].observe(value)
+            for (name, _), value in zip(COUNTERS, (metrics.cache_hits,
+                                                   metrics.cache_misses)):
+                self.counters[name, view] = (
+                    self.counters.get((name, view), 0) + value)
+            if duration >= SLOW_REQUEST_SECONDS:
+                self.slow.append({
+                    'path': request.get_full_path(),
+                    'view': view,
+                    'status': response.status_code,
+                    'duration': round(duration, 6),
+                    'db_duration': round(metrics.db_seconds, 6),
+                    'queries': [
+                        {'sql': sql, 'duration': round(seconds, 6)}
+                        for sql, seconds in metrics.queries[
+                            :SLOW_QUERIES_KEPT]],
+                })
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        lines = []
+        with self.lock:
+            for name, help_text, _ in HISTOGRAMS:
+                lines += [f'# HELP {name} {help_text}',
+                          f'# TYPE {name} histogram']
+                for (metric, view), histogram in sorted(
+                        self.histograms.items()):
+                    if metric == name:
+                        lines += histogram.lines(name, f'view="{view}"')
+            for name, help_text in COUNTERS:
+                lines += [f'# HELP {name} {help_text}',
+                          f'# TYPE {name} counter']
+                lines += [f'{name}{{view="{view}"}} {value}'
+                          for (metric, view), value in sorted(
+                              self.counters.items()) if metric == name]
+        return '\n'.join(lines) + '\n'
+
+    def slow_requests(self):
+        """Медленные запросы от новых к старым."""
+        with self.lock:
+            return list(reversed(self.slow))
+
+
+registry = Registry()
+
+
+class InstrumentedCache:
+    """
+    Обертка над настоящим бэкендом кеша, считающая попадания и промахи.
+
+    Настоящий бэкенд указывается в OPTIONS['BACKEND'], остальные
+    параметры передаются ему как есть.
+
+    """
+
+    _missing = object()
+
+    def __init__(self, location, params):
+        """Создаем вложенный бэкенд."""
+        params = dict(params)
+        options = dict(params.pop('OPTIONS', {}))
+        backend = import_string(options.pop('BACKEND'))
+        self._cache = backend(location, {**params, 'OPTIONS': options})
+
+    def __getattr__(self, name):
+        """Остальные методы отдаем вложенному бэкенду."""
+        return getattr(self._cache, name)
+
+    def __contains__(self, key):
+        """Оператор in, которым пользуются сессии cached_db."""
+        return key in self._cache
+
+    def get(self, key, default=None, version=None):
+        """Прочитать значение и учесть результат."""
+        value = self._cache.get(key, self._missing, version=version)
+        if value is self._missing:
+            cache_result(0, 1)
+            return default
+        cache_result(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        """Прочитать значения и учесть результаты."""
+        keys = list(keys)
+        values = self._cache.get_many(keys, version=version)
+        cache_result(len(values), len(keys) - len(values))
+        return values
+
+
+class InstrumentedTemplate(Template):
+    """Шаблон, учитывающий время своей отрисовки."""
+
+    def render(self, context=None, request=None):
+        """Отрисовать шаблон; вложенные отрисовки не учитываются дважды."""
+        metrics = current.get()
+        if metrics is None:
+            return super().render(context, request)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_seconds += time.perf_counter() - started
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """Шаблонизатор Django, отдающий шаблоны с замером отрисовки."""
+
+    def from_string(self, template_code):
+        """Шаблон из строки."""
+        return InstrumentedTemplate(
+            super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        """Шаблон по имени."""
+        return InstrumentedTemplate(
+            super().get_template(template_name).template, self)
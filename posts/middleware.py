@@ -0,0 +1,140 @@
+"""Промежуточные слои приложения posts."""
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers
+)
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import quote_etag
+
+from posts.cache import CACHE_TIMEOUT, PAGE_MAX_AGE, PAGE_PREFIX, page_etag
+from posts.metrics import RequestMetrics, current, registry
+from posts.usercache import get_cached_user
+
+
+class MetricsMiddleware:
+    """
+    Замер каждого запроса: время, запросы к базе, кеш и шаблоны.
+
+    Счетчики запроса хранятся в contextvar, куда их дописывают обертки
+    базы, кеша и шаблонов; по завершении запроса они сводятся в
+    гистограммы по имени view.
+
+    """
+
+    def __init__(self, get_response):
+        """Запоминаем следующий обработчик."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Обрабатываем запрос под замером."""
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.execute))
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        registry.record(request, response, metrics)
+        return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware, берущий пользователя сессии из кеша."""
+
+    def process_request(self, request):
+        """Пользователь загружается лениво, при первом обращении."""
+        assert hasattr(request, 'session'), (
+            'CachedAuthenticationMiddleware requires SessionMiddleware.')
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кеш целых ответов анонимам для view с posts.cache.cache_anonymous.
+
+    Анонимом считается запрос без куки сессии и сообщений, поэтому
+    попадание в кеш не проходит через сессии, CSRF, сообщения и
+    отрисовку. Ключ и ETag строятся по адресу с параметрами и
+    поколениям областей страницы, которые меняются при правке постов,
+    комментариев и подписок. Ответы помечаются Vary: Cookie и
+    Cache-Control: public, чтобы их мог кешировать и обратный прокси;
+    ответы тех же страниц вошедшим пользователям помечаются private.
+
+    """
+
+    def __init__(self, get_response):
+        """Запоминаем следующий обработчик."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Отдаем страницу из кеша или кешируем ответ."""
+        match = self.cacheable_match(request)
+        if match is None:
+            return self.get_response(request)
+        if not self.is_anonymous(request):
+            response = self.get_response(request)
+            patch_vary_headers(response, ('Cookie',))
+            patch_cache_control(response, private=True)
+            return response
+        scopes = match.func.page_cache_scopes(request, *match.args,
+                                              **match.kwargs)
+        if scopes is None:
+            return self.get_response(request)
+        # Ответ из кеша минует view; метрики учитывают его под ее именем.
+        request.resolver_match = match
+        etag = page_etag(request.get_full_path(), *scopes)
+        response = get_conditional_response(request, etag=quote_etag(etag))
+        if response is None:
+            response = self.cached_response(request, PAGE_PREFIX + etag)
+        patch_vary_headers(response, ('Cookie',))
+        if response.status_code in (200, 304):
+            response['ETag'] = quote_etag(etag)
+            patch_cache_control(response, public=True, max_age=PAGE_MAX_AGE)
+        return response
+
+    def cacheable_match(self, request):
+        """Маршрут кешируемой страницы или None."""
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if not hasattr(match.func, 'page_cache_scopes'):
+            return None
+        return match
+
+    def is_anonymous(self, request):
+        """Запрос без сессии и сообщений: ответ одинаков для всех."""
+        return (settings.SESSION_COOKIE_NAME not in request.COOKIES
+                and CookieStorage.cookie_name not in request.COOKIES)
+
+    def cached_response(self, request, key):
+        """Ответ из кеша или от view с сохранением в кеш."""
+        entry = cache.get(key)
+        if entry is not None:
+            content, headers = entry
+            response = HttpResponse(content)
+            for header, value in headers:
+                response[header] = value
+            return response
+        response = self.get_response(request)
+        if (request.method == 'GET' and response.status_code == 200
+                and not response.streaming and not response.cookies
+                and not response.has_header('Cache-Control')):
+            cache.set(key, (response.content, list(response.items())),
+                      CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+# Копия posts.counters на момент миграции: миграция не должна зависеть
+# от того, как модели и счетчики устроены в текущем коде.
+def count(model, field, outer='pk'):
+    rows = model.objects.filter(**{field: models.OuterRef(outer)}).order_by()
+    rows = rows.values(field).annotate(total=models.Count('pk'))
+    return Coalesce(models.Subquery(rows.values('total')), 0)
+
+
+def fill_counters(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    missing = User.objects.using(db).filter(
+        stats__isnull=True).values_list('pk', flat=True)
+    UserStats.objects.using(db).bulk_create(
+        [UserStats(user_id=pk) for pk in missing], batch_size=500)
+
+    Post.objects.using(db).update(comment_count=count(Comment, 'post'))
+    UserStats.objects.using(db).update(
+        posts_count=count(Post, 'author', 'user'),
+        followers_count=count(Follow, 'author', 'user'),
+        following_count=count(Follow, 'user', 'user'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0014_auto_20200529_2112'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписан')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия posts.timeline.rebuild_timelines на момент миграции.
+TIMELINE_LENGTH = getattr(settings, 'TIMELINE_LENGTH', 1000)
+TIMELINE_FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+
+
+def fill_timelines(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    follows = Follow.objects.using(db).exclude(
+        author__stats__followers_count__gt=TIMELINE_FANOUT_LIMIT,
+    ).values_list('user_id', 'author_id')
+    for user_id, author_id in list(follows):
+        posts = Post.objects.using(db).filter(author_id=author_id).order_by(
+            '-pub_date').values_list('pk', 'pub_date')[:TIMELINE_LENGTH]
+        TimelineEntry.objects.using(db).bulk_create(
+            [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+             for pk, pub_date in posts],
+            batch_size=500, ignore_conflicts=True)
+        entries = TimelineEntry.objects.using(db).filter(user_id=user_id)
+        oldest = entries.order_by('-pub_date', '-post_id').values_list(
+            'pub_date', flat=True)[TIMELINE_LENGTH:TIMELINE_LENGTH + 1]
+        if oldest:
+            entries.filter(pub_date__lte=oldest[0]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='posts_timel_user_id_b48120_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timelineentry',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
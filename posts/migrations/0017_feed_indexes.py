@@ -0,0 +1,57 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:26
+
+from django.db import migrations, models
+from django.db.models import Min
+from django.db.models.functions import Coalesce
+
+
+def count(model, field):
+    rows = model.objects.filter(**{field: models.OuterRef('user')}).order_by()
+    rows = rows.values(field).annotate(total=models.Count('pk'))
+    return Coalesce(models.Subquery(rows.values('total')), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    keep = Follow.objects.using(db).values('user', 'author').annotate(
+        first=Min('id')).values_list('first', flat=True)
+    deleted, _ = Follow.objects.using(db).exclude(id__in=list(keep)).delete()
+    if deleted:
+        # Дубликаты входили в счетчики подписок, пересчитываем только их.
+        UserStats.objects.using(db).update(
+            followers_count=count(Follow, 'author'),
+            following_count=count(Follow, 'user'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created'], name='posts_comme_post_id_581ffd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date'], name='posts_post_pub_dat_efcc38_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date'], name='posts_post_author__7827da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date'], name='posts_post_group_i_1fdac4_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:34
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.utils import OperationalError
+import django.db.models.deletion
+
+import snowballstemmer
+
+# Копия posts.search на момент миграции: индекс заполняется через
+# соединение schema_editor, а не через глобальное соединение приложения.
+FTS_TABLE = 'posts_search_fts'
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile('[а-я]')
+
+
+def terms(text):
+    russian = snowballstemmer.stemmer('russian')
+    english = snowballstemmer.stemmer('english')
+    result = []
+    for word in WORD.findall(text.lower().replace('ё', 'е')):
+        stemmer = russian if CYRILLIC.search(word) else english
+        result.append(stemmer.stemWord(word))
+    return result
+
+
+def documents(apps, db):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    for pk, text in Post.objects.using(db).values_list(
+            'pk', 'text').iterator():
+        yield pk * 2, pk, terms(text)
+    for pk, post_id, text in Comment.objects.using(db).values_list(
+            'pk', 'post_id', 'text').iterator():
+        yield pk * 2 + 1, post_id, terms(text)
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    backend = getattr(settings, 'SEARCH_BACKEND', None)
+    fts = False
+    if connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+                f'post_id UNINDEXED, body, tokenize="unicode61")')
+            fts = backend in (None, 'fts5')
+        except OperationalError:
+            # SQLite собран без FTS5, будет использован SearchPosting.
+            pass
+    if fts:
+        with connection.cursor() as cursor:
+            for rowid, post_id, words in documents(apps, connection.alias):
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, post_id, body) '
+                    f'VALUES (%s, %s, %s)', [rowid, post_id, ' '.join(words)])
+        return
+    SearchPosting = apps.get_model('posts', 'SearchPosting')
+    for rowid, post_id, words in documents(apps, connection.alias):
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        SearchPosting.objects.using(connection.alias).bulk_create(
+            SearchPosting(term=term[:100], document=rowid, post_id=post_id,
+                          weight=count / len(words))
+            for term, count in counts.items())
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('document', models.BigIntegerField(db_index=True)),
+                ('weight', models.FloatField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='posts.Post')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['term', 'post'], name='posts_searc_term_218a6d_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -1,10 +1,26 @@
 """Модели приложения posts."""
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
 
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    """Выборки постов."""
+
+    def feed(self):
+        """
+        Посты для ленты.
+
+        Автор и группа подтягиваются одним JOIN, число комментариев хранится
+        в самом посте, поэтому карточка поста не делает дополнительных
+        запросов.
+
+        """
+        return self.select_related('author', 'group')
+
+
 class Group(models.Model):
     """Модель для хранения групп."""
 
@@ -23,6 +39,7 @@ class Post(models.Model):
     text = models.TextField(verbose_name='Текст')
     pub_date = models.DateTimeField('Дата публикации',
                                     auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
                                verbose_name='Автор',
@@ -34,16 +51,63 @@ class Post(models.Model):
                               verbose_name='Группа',
                               related_name='group_posts')
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    image_width = models.PositiveIntegerField(blank=True, null=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField(blank=True, null=True,
+                                               editable=False)
+    image_derivatives = models.TextField('Производные картинки',
+                                         blank=True,
+                                         editable=False)
+    comment_count = models.PositiveIntegerField('Число комментариев',
+                                                default=0,
+                                                editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        """Переопределяем сортировку по умолчанию."""
+        """Переопределяем сортировку по умолчанию, индексы для лент."""
 
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id']),
+            models.Index(fields=['author', '-pub_date', '-id']),
+            models.Index(fields=['group', '-pub_date', '-id']),
+        ]
 
     def __str__(self):
         """Переопределяем строковое представление модели Group."""
         return self.text
 
+    def derivatives(self, extension):
+        """Имена и ширины производных картинки с расширением extension."""
+        for line in self.image_derivatives.splitlines():
+            name, width = line.rsplit(' ', 1)
+            if name.endswith(f'.{extension}'):
+                yield name, int(width)
+
+    def srcset(self, extension):
+        """Значение srcset из производных картинки."""
+        storage = self.image.storage
+        return ', '.join(f'{storage.url(name)} {width}w'
+                         for name, width in self.derivatives(extension))
+
+    @property
+    def jpeg_srcset(self):
+        """Значение srcset для JPEG."""
+        return self.srcset('jpg')
+
+    @property
+    def webp_srcset(self):
+        """Значение srcset для WebP."""
+        return self.srcset('webp')
+
+    @property
+    def card_url(self):
+        """Адрес основной карточки картинки в JPEG."""
+        for name, width in self.derivatives('jpg'):
+            return self.image.storage.url(name)
+        return ''
+
 
 class Comment(models.Model):
     """Модель для хранения комментариев."""
@@ -52,8 +116,11 @@ class Comment(models.Model):
                              on_delete=models.CASCADE,
                              verbose_name='Пост',
                              related_name='post_comment')
+    # null=True как в схеме базы: в старых данных есть комментарии без
+    # автора, форма и представления всегда его заполняют.
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
+                               null=True,
                                verbose_name='Автор',
                                related_name='author_comment')
     text = models.TextField(blank=False,
@@ -62,9 +129,10 @@ class Comment(models.Model):
                                    editable=False)
 
     class Meta:
-        """Переопределяем сортировку по умолчанию."""
+        """Переопределяем сортировку по умолчанию, индекс для комментариев."""
 
         ordering = ['-created']
+        indexes = [models.Index(fields=['post', '-created', '-id'])]
 
 
 class Follow(models.Model):
@@ -80,3 +148,88 @@ class Follow(models.Model):
                                blank=False,
                                null=False,
                                related_name='following')
+
+    class Meta:
+        """Одна подписка на автора от одного пользователя."""
+
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Модель для хранения ленты подписок пользователя."""
+
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        """Одна запись на пост в ленте, индекс для выборки ленты."""
+
+        unique_together = ('user', 'post')
+        indexes = [models.Index(fields=['user', '-pub_date', '-post'])]
+
+
+class SearchPosting(models.Model):
+    """
+    Модель для хранения поискового индекса.
+
+    Используется, когда база не поддерживает SQLite FTS5. Документ — текст
+    поста или комментария, см. posts.search.
+
+    """
+
+    term = models.CharField(max_length=100)
+    document = models.BigIntegerField(db_index=True)
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='search_postings')
+    weight = models.FloatField()
+
+    class Meta:
+        """Индекс для выборки документов по слову."""
+
+        indexes = [models.Index(fields=['term', 'post'])]
+
+
+class UserStats(models.Model):
+    """Модель для хранения счетчиков пользователя."""
+
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='stats')
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписан', default=0)
+
+    def __str__(self):
+        """Переопределяем строковое представление модели UserStats."""
+        return str(self.user)
+
+
+class Task(models.Model):
+    """Модель для хранения фоновой задачи, см. posts.queue."""
+
+    name = models.CharField('Задача', max_length=100)
+    payload = models.TextField('Аргументы JSON')
+    run_at = models.DateTimeField('Выполнить после', default=timezone.now)
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    locked_until = models.DateTimeField('Занята до', null=True, blank=True)
+    failed = models.BooleanField('Ошибка', default=False)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        """Индекс для выборки готовых к выполнению задач."""
+
+        indexes = [models.Index(fields=['failed', 'run_at'])]
+
+    def __str__(self):
+        """Переопределяем строковое представление модели Task."""
+        return f'{self.name} {self.payload}'
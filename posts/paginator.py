@@ -0,0 +1,135 @@
+"""Курсорная (keyset) пагинация лент постов."""
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.utils.dateparse import parse_datetime
+
+POSTS_PER_PAGE = 10
+# Комментарии поста: первая отрисовка и каждая догрузка не больше этого.
+COMMENTS_PER_PAGE = 20
+
+CURSOR_SALT = 'posts.paginator.cursor'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def keyset(queryset, date_field, pk_field, position, direction):
+    """
+    Выборка после позиции (дата, id) в порядке обхода ленты.
+
+    Условие записано как диапазон по дате без OR, поэтому SQLite идет
+    по индексу (..., дата, id) и не сортирует результат отдельно.
+
+    """
+    if direction == NEXT:
+        ordering = (f'-{date_field}', f'-{pk_field}')
+    else:
+        ordering = (date_field, pk_field)
+    if position is None:
+        return queryset.order_by(*ordering)
+    value, pk = position
+    if direction == NEXT:
+        queryset = queryset.filter(**{f'{date_field}__lte': value}).exclude(
+            **{date_field: value, f'{pk_field}__gte': pk})
+    else:
+        queryset = queryset.filter(**{f'{date_field}__gte': value}).exclude(
+            **{date_field: value, f'{pk_field}__lte': pk})
+    return queryset.order_by(*ordering)
+
+
+class CursorPaginator:
+    """
+    Пагинатор по ключу (дата, id) без COUNT(*) и OFFSET.
+
+    Страница выбирается условием WHERE по последней записи предыдущей
+    страницы, поэтому глубокие страницы стоят столько же, сколько первая.
+    Навигация выполняется непрозрачными токенами из параметра ?cursor=.
+
+    """
+
+    def __init__(self, object_list, per_page=POSTS_PER_PAGE,
+                 date_field='pub_date'):
+        """Запоминаем выборку, размер страницы и поле сортировки."""
+        self.object_list = object_list
+        self.per_page = per_page
+        self.date_field = date_field
+
+    def encode(self, obj, direction, number):
+        """Упаковать позицию записи в подписанный токен."""
+        value = getattr(obj, self.date_field)
+        return signing.dumps([value.isoformat(), obj.pk, direction, number],
+                             salt=CURSOR_SALT)
+
+    def decode(self, token):
+        """Распаковать токен, для испорченного токена вернуть None."""
+        try:
+            value, pk, direction, number = signing.loads(token,
+                                                         salt=CURSOR_SALT)
+            value = parse_datetime(value)
+            pk, number = int(pk), int(number)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if value is None or direction not in (NEXT, PREVIOUS):
+            return None
+        return value, pk, direction, max(number, 1)
+
+    def fetch(self, position, direction, limit):
+        """
+        До limit записей после позиции (дата, id) в сторону direction.
+
+        Без позиции отдается начало ленты. Записи идут в порядке обхода:
+        для NEXT от новых к старым, для PREVIOUS от старых к новым.
+
+        """
+        return list(keyset(self.object_list, self.date_field, 'pk',
+                           position, direction)[:limit])
+
+    def get_page(self, token=None):
+        """
+        Вернуть страницу по токену.
+
+        Возвращается обычный Page, дополненный атрибутами next_cursor и
+        previous_cursor. Для пустого или неверного токена отдается первая
+        страница.
+
+        """
+        cursor = self.decode(token) if token else None
+        limit = self.per_page + 1
+        if cursor is None:
+            number = 1
+            rows = self.fetch(None, NEXT, limit)
+            has_next = len(rows) > self.per_page
+            has_previous = False
+            rows = rows[:self.per_page]
+        elif cursor[2] == NEXT:
+            value, pk, direction, number = cursor
+            rows = self.fetch((value, pk), NEXT, limit)
+            has_next = len(rows) > self.per_page
+            has_previous = True
+            rows = rows[:self.per_page]
+        else:
+            value, pk, direction, number = cursor
+            rows = self.fetch((value, pk), PREVIOUS, limit)
+            has_next = True
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            if not has_previous:
+                number = 1
+        if cursor is not None and not rows:
+            return self.get_page()
+
+        # Paginator оставлен ради совместимости контекста шаблонов; он
+        # ленивый и без обращения к page_range не выполняет COUNT(*).
+        page = Page(rows, number, Paginator(self.object_list, self.per_page))
+        page.next_cursor = None
+        page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = self.encode(rows[-1], NEXT, number + 1)
+        if rows and has_previous:
+            page.previous_cursor = self.encode(rows[0], PREVIOUS, number - 1)
+        return page
+
+
+def comments_page(post_comments, cursor=None):
+    """Страница комментариев поста по курсору, новые сначала."""
+    return CursorPaginator(post_comments, COMMENTS_PER_PAGE,
+                           date_field='created').get_page(cursor)
@@ -0,0 +1,112 @@
+"""Очередь фоновых задач в таблице базы данных."""
+import datetime as dt
+import json
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from posts.models import Task
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повтором растет вдвое с каждой неудачной попыткой.
+RETRY_DELAY = getattr(settings, 'POSTS_TASK_RETRY_DELAY', 5)
+MAX_ATTEMPTS = getattr(settings, 'POSTS_TASK_MAX_ATTEMPTS', 5)
+# Сколько секунд задача числится за воркером; после этого срока ее
+# может забрать другой воркер, если первый упал.
+LEASE_SECONDS = 300
+
+TASKS = {}
+
+
+def task(func):
+    """Зарегистрировать функцию как задачу под ее именем."""
+    TASKS[func.__name__] = func
+    return func
+
+
+def is_eager():
+    """Выполнять ли задачи сразу, без очереди."""
+    return getattr(settings, 'POSTS_TASKS_EAGER', False)
+
+
+def enqueue(name, **kwargs):
+    """
+    Поставить задачу в очередь.
+
+    Строка задачи пишется в текущей транзакции и становится видна
+    воркеру вместе с данными, которые ее породили. В режиме
+    POSTS_TASKS_EAGER задача выполняется сразу.
+
+    """
+    if is_eager():
+        return TASKS[name](**kwargs)
+    Task.objects.create(name=name, payload=json.dumps(kwargs))
+    return None
+
+
+def enqueue_later(seconds, name, **kwargs):
+    """
+    Поставить задачу, которая выполнится не раньше чем через seconds.
+
+    В режиме POSTS_TASKS_EAGER задача выполняется сразу.
+
+    """
+    if is_eager():
+        return TASKS[name](**kwargs)
+    Task.objects.create(
+        name=name, payload=json.dumps(kwargs),
+        run_at=timezone.now() + dt.timedelta(seconds=seconds))
+    return None
+
+
+def claim(limit):
+    """Забрать до limit готовых задач, продлив их аренду."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(Task.objects.select_for_update(skip_locked=True).filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+            failed=False, run_at__lte=now,
+        ).order_by('run_at', 'pk').values_list('pk', flat=True)[:limit])
+        Task.objects.filter(pk__in=ids).update(
+            locked_until=now + dt.timedelta(seconds=LEASE_SECONDS),
+            attempts=F('attempts') + 1)
+    return list(Task.objects.filter(pk__in=ids).order_by('run_at', 'pk'))
+
+
+def execute(item):
+    """
+    Выполнить задачу; при ошибке отложить повтор.
+
+    Успешная задача удаляется в той же транзакции, что и ее работа.
+    После MAX_ATTEMPTS неудач задача помечается failed и остается в
+    таблице для разбора.
+
+    """
+    try:
+        with transaction.atomic():
+            TASKS[item.name](**json.loads(item.payload))
+            item.delete()
+        return True
+    except Exception:
+        logger.exception('Задача %s не выполнена', item)
+        item.last_error = traceback.format_exc()
+        item.locked_until = None
+        if item.attempts >= MAX_ATTEMPTS:
+            item.failed = True
+        else:
+            item.run_at = timezone.now() + dt.timedelta(
+                seconds=RETRY_DELAY * 2 ** (item.attempts - 1))
+        item.save(update_fields=['last_error', 'locked_until', 'failed',
+                                 'run_at'])
+        return False
+
+
+def run_pending(limit=100):
+    """Выполнить пачку готовых задач, вернуть число успешных и неудачных."""
+    results = [execute(item) for item in claim(limit)]
+    return results.count(True), results.count(False)
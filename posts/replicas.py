@@ -0,0 +1,87 @@
+"""Чтение лент с реплик базы данных."""
+import contextvars
+import random
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Сколько секунд после записи пользователь читает только с основной базы.
+REPLICA_PIN_SECONDS = getattr(settings, 'POSTS_REPLICA_PIN_SECONDS', 10)
+PIN_COOKIE = 'primary_pin'
+# Приложения, модели которых читаются с реплик. Сессии и пользователи
+# остаются на основной базе, чтобы вход и регистрация были видны сразу.
+REPLICA_APPS = {'posts'}
+
+read_alias = contextvars.ContextVar('posts_read_alias', default=None)
+
+
+def replica_aliases():
+    """Алиасы реплик: POSTS_REPLICAS или все базы, кроме основной."""
+    replicas = getattr(settings, 'POSTS_REPLICAS', None)
+    if replicas is None:
+        replicas = [alias for alias in settings.DATABASES
+                    if alias != DEFAULT_DB_ALIAS]
+    return list(replicas)
+
+
+def is_pinned(request):
+    """Пользователь недавно писал и должен видеть свои изменения."""
+    return PIN_COOKIE in request.COOKIES
+
+
+def use_replica(view):
+    """
+    Декоратор view только для чтения: запросы к моделям идут на реплику.
+
+    Реплика выбирается случайно на каждый запрос. Если реплик нет или
+    пользователь закреплен за основной базой, ничего не меняется.
+
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        replicas = replica_aliases()
+        if not replicas or is_pinned(request):
+            return view(request, *args, **kwargs)
+        token = read_alias.set(random.choice(replicas))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            read_alias.reset(token)
+    return wrapper
+
+
+def pin_primary(view):
+    """
+    Декоратор пишущей view: закрепить пользователя за основной базой.
+
+    Пока живет кука, его страницы читаются с основной базы и не
+    отстают от только что сделанной записи на время репликации.
+
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if replica_aliases():
+            response.set_cookie(PIN_COOKIE, '1', max_age=REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    """Роутер: чтение моделей posts внутри use_replica идет на реплику."""
+
+    def db_for_read(self, model, **hints):
+        """База для чтения."""
+        if model._meta.app_label in REPLICA_APPS:
+            return read_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        """Запись всегда идет в основную базу."""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Реплики содержат те же данные, связи между ними допустимы."""
+        return True
@@ -0,0 +1,138 @@
+"""Полнотекстовый поиск по постам и комментариям."""
+import re
+from functools import lru_cache
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import connection, models
+
+import snowballstemmer
+
+FTS_TABLE = 'posts_search_fts'
+# 'fts5' — SQLite FTS5, 'postings' — таблица SearchPosting для любой базы,
+# None — выбрать автоматически.
+SEARCH_BACKEND = getattr(settings, 'SEARCH_BACKEND', None)
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile('[а-я]')
+
+
+def terms(text):
+    """Основы слов текста: русские и английские слова стеммируются."""
+    russian = snowballstemmer.stemmer('russian')
+    english = snowballstemmer.stemmer('english')
+    result = []
+    for word in WORD.findall(text.lower().replace('ё', 'е')):
+        stemmer = russian if CYRILLIC.search(word) else english
+        result.append(stemmer.stemWord(word))
+    return result
+
+
+def post_rowid(post_id):
+    """Номер строки индекса для текста поста."""
+    return post_id * 2
+
+
+def comment_rowid(comment_id):
+    """Номер строки индекса для текста комментария."""
+    return comment_id * 2 + 1
+
+
+@lru_cache(maxsize=None)
+def fts_available():
+    """Есть ли в базе таблица FTS5 (создается миграцией на SQLite)."""
+    if connection.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def backend():
+    """Имя используемого механизма индекса."""
+    if SEARCH_BACKEND:
+        return SEARCH_BACKEND
+    return 'fts5' if fts_available() else 'postings'
+
+
+def index_document(rowid, post_id, text, apps=django_apps):
+    """Заменить в индексе документ rowid текстом text."""
+    words = terms(text)
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [rowid])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, post_id, body) '
+                f'VALUES (%s, %s, %s)', [rowid, post_id, ' '.join(words)])
+        return
+    posting_model = apps.get_model('posts', 'SearchPosting')
+    posting_model.objects.filter(document=rowid).delete()
+    counts = {}
+    for word in words:
+        counts[word] = counts.get(word, 0) + 1
+    posting_model.objects.bulk_create(
+        posting_model(term=term[:100], document=rowid, post_id=post_id,
+                      weight=count / len(words))
+        for term, count in counts.items())
+
+
+def unindex_document(rowid):
+    """Удалить документ rowid из индекса."""
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [rowid])
+        return
+    posting_model = django_apps.get_model('posts', 'SearchPosting')
+    posting_model.objects.filter(document=rowid).delete()
+
+
+def search_post_ids(query, limit, offset=0):
+    """
+    Найти посты, в тексте или комментариях которых есть все слова query.
+
+    Слова могут встречаться в разных документах одного поста: одно в
+    тексте, другое в комментарии. Возвращает id постов по убыванию
+    релевантности.
+
+    """
+    words = sorted(set(terms(query)))
+    if not words:
+        return []
+    if backend() == 'fts5':
+        # Для каждого слова берется лучший документ каждого поста, пост
+        # подходит, если нашлись строки по всем словам.
+        per_word = ' UNION ALL '.join(
+            f'SELECT post_id, MIN(rank) AS score FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s GROUP BY post_id' for _ in words)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id, SUM(score) FROM ({per_word}) '
+                f'GROUP BY post_id HAVING COUNT(*) = %s '
+                f'ORDER BY 2, 1 DESC LIMIT %s OFFSET %s',
+                ['"{}"'.format(word) for word in words]
+                + [len(words), limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+    posting_model = django_apps.get_model('posts', 'SearchPosting')
+    ranked = posting_model.objects.filter(term__in=words).values(
+        'post_id').annotate(
+        matched=models.Count('term', distinct=True),
+        score=models.Sum('weight'),
+    ).filter(matched=len(words)).order_by('-score', '-post_id')
+    return list(ranked.values_list('post_id', flat=True)[
+        offset:offset + limit])
+
+
+def rebuild_index(apps=django_apps):
+    """Проиндексировать заново все посты и комментарии."""
+    post_model = apps.get_model('posts', 'Post')
+    comment_model = apps.get_model('posts', 'Comment')
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    else:
+        apps.get_model('posts', 'SearchPosting').objects.all().delete()
+    for pk, text in post_model.objects.values_list('pk', 'text').iterator():
+        index_document(post_rowid(pk), pk, text, apps)
+    for pk, post_id, text in comment_model.objects.values_list(
+            'pk', 'post_id', 'text').iterator():
+        index_document(comment_rowid(pk), post_id, text, apps)
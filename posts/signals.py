@@ -0,0 +1,231 @@
+"""Обработчики сигналов моделей приложения posts."""
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_save
+)
+from django.dispatch import receiver
+
+from posts.cache import ALL_POSTS, author_scope, group_scope, post_scope
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+from posts.queue import enqueue, enqueue_later
+from posts.replicas import REPLICA_PIN_SECONDS, replica_aliases
+from posts.search import comment_rowid, fts_available, post_rowid
+from posts.usercache import forget_user
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    """Завести счетчики новому пользователю."""
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    """Учесть новый пост в счетчике автора и в лентах подписчиков."""
+    if created:
+        enqueue('change_user_stats', user_id=instance.author_id,
+                posts_count=1)
+        enqueue('fan_out', post_id=instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    """Учесть удаление поста в счетчике автора."""
+    enqueue('change_user_stats', user_id=instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    """Учесть новый комментарий в счетчике поста."""
+    if created:
+        enqueue('change_comment_count', post_id=instance.post_id, delta=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    """Учесть удаление комментария в счетчике поста."""
+    enqueue('change_comment_count', post_id=instance.post_id, delta=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """Учесть новую подписку в счетчиках и в ленте подписчика."""
+    if created:
+        enqueue('change_user_stats', user_id=instance.author_id,
+                followers_count=1)
+        enqueue('change_user_stats', user_id=instance.user_id,
+                following_count=1)
+        enqueue('backfill', user_id=instance.user_id,
+                author_id=instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Учесть отписку в счетчиках и в ленте подписчика."""
+    enqueue('change_user_stats', user_id=instance.author_id,
+            followers_count=-1)
+    enqueue('change_user_stats', user_id=instance.user_id,
+            following_count=-1)
+    enqueue('remove', user_id=instance.user_id, author_id=instance.author_id)
+
+
+def enqueue_after_commit(name, **kwargs):
+    """
+    Поставить задачу сброса кеша после фиксации транзакции.
+
+    Если сменить поколение внутри транзакции записи, параллельный
+    запрос увидит новое поколение, но прежние строки, и сохранит
+    старый HTML под новым ключом на все время жизни кеша. Запрос,
+    читающий отстающую реплику, может сделать то же и после фиксации,
+    поэтому при репликах сброс повторяется через REPLICA_PIN_SECONDS.
+
+    """
+    transaction.on_commit(lambda: enqueue(name, **kwargs))
+    if replica_aliases():
+        transaction.on_commit(lambda: enqueue_later(
+            REPLICA_PIN_SECONDS, name, **kwargs))
+
+
+def bump_after_commit(scopes):
+    """Сменить поколения областей кеша после фиксации транзакции."""
+    enqueue_after_commit('bump', scopes=scopes)
+
+
+def post_scopes(post):
+    """Области кеша, в которых показывается пост."""
+    scopes = [ALL_POSTS, author_scope(post.author_id), post_scope(post.pk)]
+    if post.group_id:
+        scopes.append(group_scope(post.group_id))
+    return scopes
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запомнить прежнюю группу поста, чтобы сбросить и ее кеш."""
+    instance.previous_group_id = None
+    if instance.pk:
+        instance.previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    """Сбросить кеш страниц, где показывается пост."""
+    scopes = post_scopes(instance)
+    previous_group_id = getattr(instance, 'previous_group_id', None)
+    if previous_group_id:
+        scopes.append(group_scope(previous_group_id))
+    bump_after_commit(scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    """Сбросить кеш страниц, где показывается число комментариев поста."""
+    post = Post.objects.filter(pk=instance.post_id).first()
+    if post is not None:
+        bump_after_commit(post_scopes(post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    """Сбросить кеш карточек автора и подписчика."""
+    bump_after_commit([author_scope(instance.author_id),
+                       author_scope(instance.user_id)])
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group(sender, instance, created, **kwargs):
+    """
+    Сбросить кеш страниц, где видно название группы.
+
+    Название выводится в карточках постов группы на главной, в ленте
+    и на страницах постов, поэтому их поколения тоже сменяются.
+
+    """
+    if created:
+        bump_after_commit([group_scope(instance.pk)])
+    else:
+        enqueue_after_commit('bump_group_pages', group_id=instance.pk)
+
+
+def is_login_only(update_fields):
+    """Сохранение только времени входа, снимок пользователя не меняется."""
+    return bool(update_fields) and set(update_fields) == {'last_login'}
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    """Сбросить кеш профиля пользователя, кроме записи времени входа."""
+    if is_login_only(update_fields):
+        return
+    previous_username = getattr(instance, 'previous_username', None)
+    if previous_username and previous_username != instance.username:
+        # username виден в карточках постов и в комментариях на чужих
+        # страницах, а не только в профиле.
+        enqueue_after_commit('bump_author_pages', user_id=instance.pk)
+    else:
+        bump_after_commit([author_scope(instance.pk)])
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, **kwargs):
+    """Запомнить прежний username, чтобы сбросить и его снимок."""
+    instance.previous_username = None
+    if instance.pk and not is_login_only(update_fields):
+        instance.previous_username = User.objects.filter(
+            pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_snapshot(sender, instance, update_fields=None, **kwargs):
+    """
+    Сбросить снимок пользователя в кеше.
+
+    Сбрасывается сразу, без очереди задач: иначе только что
+    зарегистрированный пользователь мог бы остаться в отрицательном кеше.
+
+    """
+    if not is_login_only(update_fields):
+        forget_user(instance.pk, instance.username,
+                    getattr(instance, 'previous_username', None))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    """Обновить текст поста в поисковом индексе."""
+    enqueue('index_document', rowid=post_rowid(instance.pk),
+            post_id=instance.pk, text=instance.text)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    """Удалить пост из поискового индекса."""
+    enqueue('unindex_document', rowid=post_rowid(instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    """Обновить текст комментария в поисковом индексе."""
+    enqueue('index_document', rowid=comment_rowid(instance.pk),
+            post_id=instance.post_id, text=instance.text)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    """Удалить комментарий из поискового индекса."""
+    enqueue('unindex_document', rowid=comment_rowid(instance.pk))
+
+
+@receiver(post_migrate)
+def reset_search_backend(sender, **kwargs):
+    """Миграции могли создать или удалить таблицу FTS5."""
+    if sender.name == 'posts':
+        fts_available.cache_clear()
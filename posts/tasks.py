@@ -0,0 +1,90 @@
+"""Фоновые задачи, которые порождает запись постов, комментариев и подписок."""
+from posts import cache, counters, search, thumbnails, timeline
+from posts.models import Comment, Post
+from posts.queue import task
+
+
+@task
+def generate_thumbnails(name):
+    """Подготовить миниатюры картинки."""
+    if not thumbnails.generate_thumbnails(name):
+        raise RuntimeError(f'Не удалось подготовить миниатюры {name}')
+
+
+@task
+def change_comment_count(post_id, delta):
+    """Изменить счетчик комментариев поста."""
+    counters.change_comment_count(post_id, delta)
+
+
+@task
+def change_user_stats(user_id, **deltas):
+    """Изменить счетчики пользователя и при нужде перестроить ленты."""
+    if 'followers_count' not in deltas:
+        counters.change_user_stats(user_id, **deltas)
+        return
+    was_fanout = timeline.is_fanout_author(user_id)
+    counters.change_user_stats(user_id, **deltas)
+    timeline.update_fanout(user_id, was_fanout)
+
+
+@task
+def fan_out(post_id):
+    """Разложить пост по лентам подписчиков, если он еще существует."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        timeline.fan_out(post)
+
+
+@task
+def backfill(user_id, author_id):
+    """Добавить в ленту подписчика посты автора."""
+    if timeline.is_fanout_author(author_id):
+        timeline.backfill(user_id, author_id)
+
+
+@task
+def remove(user_id, author_id):
+    """Убрать из ленты подписчика посты автора."""
+    timeline.remove(user_id, author_id)
+
+
+@task
+def index_document(rowid, post_id, text):
+    """Обновить документ в поисковом индексе."""
+    search.index_document(rowid, post_id, text)
+
+
+@task
+def unindex_document(rowid):
+    """Удалить документ из поискового индекса."""
+    search.unindex_document(rowid)
+
+
+@task
+def bump(scopes):
+    """Сбросить кеш областей."""
+    cache.bump(*scopes)
+
+
+@task
+def bump_group_pages(group_id):
+    """Сбросить кеш страниц, где видно название группы."""
+    post_ids = Post.objects.filter(group_id=group_id).values_list(
+        'pk', flat=True)
+    cache.bump(cache.ALL_POSTS, cache.group_scope(group_id),
+               *map(cache.post_scope, post_ids))
+
+
+@task
+def bump_author_pages(user_id):
+    """Сбросить кеш страниц, где виден username пользователя."""
+    posts = Post.objects.filter(author_id=user_id)
+    group_ids = set(posts.exclude(group=None).values_list(
+        'group_id', flat=True))
+    post_ids = set(posts.values_list('pk', flat=True)) | set(
+        Comment.objects.filter(author_id=user_id).values_list(
+            'post_id', flat=True))
+    cache.bump(cache.ALL_POSTS, cache.author_scope(user_id),
+               *map(cache.group_scope, group_ids),
+               *map(cache.post_scope, post_ids))
@@ -0,0 +1,18 @@
+"""Постраничный вывод комментариев внутри кешируемого фрагмента."""
+from django import template
+
+from posts.paginator import comments_page
+
+register = template.Library()
+
+
+@register.simple_tag
+def first_comments(post_comments):
+    """
+    Первая страница комментариев поста.
+
+    Тег вызывается внутри фрагмента комментариев, поэтому страница
+    читается из базы, только если фрагмента нет в кеше.
+
+    """
+    return comments_page(post_comments)
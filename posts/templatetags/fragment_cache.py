@@ -0,0 +1,143 @@
+"""Кеширование фрагментов с ранним обновлением и одним пересчетом."""
+import math
+import random
+import time
+
+from django import template
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import TemplateSyntaxError, VariableDoesNotExist
+from django.templatetags.cache import CacheNode
+
+register = template.Library()
+
+# Сколько устаревший фрагмент хранится сверх своего срока, чтобы его
+# можно было отдавать, пока один запрос собирает новый.
+STALE_SECONDS = getattr(settings, 'POSTS_FRAGMENT_STALE_SECONDS', 300)
+# Насколько охотно фрагмент обновляется до истечения срока (XFetch).
+EARLY_REFRESH_BETA = 1.0
+LOCK_TIMEOUT = 30
+
+
+class FragmentCacheNode(CacheNode):
+    """
+    Фрагмент, который пересобирает только один запрос.
+
+    В кеше хранится версия, срок, время сборки и HTML. Незадолго до
+    срока запрос с вероятностью, растущей к сроку и времени сборки,
+    берется пересобрать фрагмент заранее. Истекший фрагмент или
+    фрагмент прежней версии пересобирает тот, кто первым взял
+    блокировку, остальные в это время отдают прежний HTML.
+
+    """
+
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on,
+                 cache_name, version_var):
+        """Запоминаем аргументы тега."""
+        super().__init__(nodelist, expire_time_var, fragment_name, vary_on,
+                         cache_name)
+        self.version_var = version_var
+
+    def resolve(self, var, context):
+        """Значение аргумента тега."""
+        try:
+            return var.resolve(context)
+        except VariableDoesNotExist:
+            raise TemplateSyntaxError(
+                f'"cache" tag got an unknown variable: {var.var!r}')
+
+    def fragment_cache(self, context):
+        """Бэкенд кеша: using=, template_fragments или default."""
+        if self.cache_name:
+            cache_name = self.resolve(self.cache_name, context)
+            try:
+                return caches[cache_name]
+            except InvalidCacheBackendError:
+                raise TemplateSyntaxError(
+                    f'Invalid cache name specified for cache tag: '
+                    f'{cache_name!r}')
+        try:
+            return caches['template_fragments']
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def render(self, context):
+        """Отдать свежий фрагмент, устаревший или собрать новый."""
+        expire_time = self.resolve(self.expire_time_var, context)
+        if expire_time is not None:
+            try:
+                expire_time = int(expire_time)
+            except (ValueError, TypeError):
+                raise TemplateSyntaxError(
+                    f'"cache" tag got a non-integer timeout value: '
+                    f'{expire_time!r}')
+        version = None
+        if self.version_var:
+            version = str(self.resolve(self.version_var, context))
+        fragment_cache = self.fragment_cache(context)
+        key = 'fresh:' + make_template_fragment_key(
+            self.fragment_name,
+            [self.resolve(var, context) for var in self.vary_on])
+
+        entry = fragment_cache.get(key)
+        if entry is None:
+            return self.rebuild(context, fragment_cache, key, version,
+                                expire_time)
+        entry_version, expires, duration, value = entry
+        # 1 - random() лежит в (0, 1], логарифм от него не падает.
+        early = duration * EARLY_REFRESH_BETA * math.log(1 - random.random())
+        if entry_version == version and time.time() - early < expires:
+            return value
+        lock = f'{key}:lock'
+        if not fragment_cache.add(lock, 1, LOCK_TIMEOUT):
+            return value
+        try:
+            return self.rebuild(context, fragment_cache, key, version,
+                                expire_time)
+        finally:
+            fragment_cache.delete(lock)
+
+    def rebuild(self, context, fragment_cache, key, version, expire_time):
+        """Собрать фрагмент и сохранить его вместе со временем сборки."""
+        started = time.time()
+        value = self.nodelist.render(context)
+        now = time.time()
+        if expire_time is None:
+            expires, timeout = math.inf, None
+        else:
+            expires, timeout = now + expire_time, expire_time + STALE_SECONDS
+        fragment_cache.set(key, (version, expires, now - started, value),
+                           timeout)
+        return value
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    """
+    Замена тега cache с защитой от одновременной пересборки.
+
+    Синтаксис тот же, что у {% cache %} из django.templatetags.cache::
+
+        {% load fragment_cache %}
+        {% cache [expire_time] [fragment_name] [var1] .. version=var %}
+
+    Необязательный version= задает версию данных: при ее смене фрагмент
+    считается устаревшим, но не пропадает, и пока его пересобирает
+    один запрос, остальные отдают прежний HTML.
+
+    """
+    nodelist = parser.parse(('endcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 2 arguments.")
+    options = {}
+    while len(tokens) > 3 and tokens[-1].startswith(('using=', 'version=')):
+        name, value = tokens.pop().split('=', 1)
+        options[name] = parser.compile_filter(value)
+    return FragmentCacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        options.get('using'), options.get('version'))
@@ -0,0 +1,19 @@
+"""Метки вставок для конкретного читателя."""
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.holes import placeholder
+
+register = template.Library()
+
+
+@register.simple_tag
+def hole(name, *args):
+    """
+    Метка вставки name с аргументами.
+
+    Метка не зависит от читателя и кешируется вместе с фрагментом;
+    posts.holes.render заменяет ее после отрисовки страницы.
+
+    """
+    return mark_safe(placeholder(name, *args))
@@ -0,0 +1,53 @@
+"""Кеширование отрисованных карточек постов."""
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.cache import CACHE_TIMEOUT, author_scope, generations, group_scope
+
+register = template.Library()
+
+
+def card_scopes(post):
+    """Области кеша автора и группы, чьи имена видны в карточке."""
+    scopes = [author_scope(post.author_id)]
+    if post.group_id:
+        scopes.append(group_scope(post.group_id))
+    return scopes
+
+
+def card_key(post, versions):
+    """Ключ карточки: пост, его версия и поколения автора и группы."""
+    return 'posts:card:{}:{}:{}:{}'.format(
+        post.pk, post.updated.timestamp(), post.comment_count,
+        ':'.join(str(versions[scope]) for scope in card_scopes(post)))
+
+
+@register.simple_tag
+def post_cards(posts):
+    """
+    Отрисовать карточки постов страницы.
+
+    Готовые карточки берутся из кеша одним get_many, недостающие
+    отрисовываются по post_item.html и сохраняются одним set_many.
+    Поколения авторов и групп страницы читаются еще одним get_many,
+    поэтому переименование пользователя или группы меняет ключи.
+    Карточки общие для всех читателей: ссылка на редактирование в них
+    - метка вставки, которую заполняет posts.holes.render.
+
+    """
+    posts = list(posts)
+    scopes = sorted({scope for post in posts for scope in card_scopes(post)})
+    versions = dict(zip(scopes, generations(*scopes)))
+    keys = [card_key(post, versions) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            missing[key] = render_to_string('post_item.html',
+                                            {'post': post})
+    if missing:
+        cache.set_many(missing, CACHE_TIMEOUT)
+        cards.update(missing)
+    return mark_safe(''.join(cards[key] for key in keys))
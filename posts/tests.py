@@ -1,15 +1,72 @@
 """Тесты view функций приложения posts."""
+import datetime as dt
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
 import time
-
-from django.test import Client, TestCase, override_settings
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import (
+    DatabaseError,
+    OperationalError,
+    connection,
+    connections,
+    transaction
+)
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-
-from posts.models import Follow, Group, Post, User
+from django.utils import timezone
+
+from PIL import Image
+from posts import benchmark
+from posts.cache import ALL_POSTS, generations
+from posts.forms import PostForm
+from posts.holes import fill_holes
+from posts.images import DERIVATIVES_DIR, derivative_names
+from posts.metrics import registry
+from posts.models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    SearchPosting,
+    Task,
+    TimelineEntry,
+    User,
+    UserStats
+)
+from posts.paginator import COMMENTS_PER_PAGE, NEXT, CursorPaginator
+from posts.queue import TASKS, enqueue, run_pending
+from posts.replicas import PIN_COOKIE, REPLICA_PIN_SECONDS
+from posts.search import backend, search_post_ids
+from posts.thumbnails import (
+    generate_in_thread,
+    generate_thumbnails,
+    schedule_thumbnails
+)
+from posts.timeline import TimelinePaginator
+from posts.transfer import Importer
 from yatube.settings import BASE_DIR
+from yatube.sqlite3.base import DatabaseWrapper
+from yatube.sqlitecache import LOCK_SUFFIX, SQLiteCache
 
 DUMMY_CACHE = {
     'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
 }
+# TestCase не фиксирует транзакцию, поэтому отложенные до фиксации
+# действия (смена поколений кеша) в этих тестах выполняются сразу.
+RUN_ON_COMMIT = mock.patch('posts.signals.transaction',
+                           mock.Mock(on_commit=lambda func: func()))
 
 
 class TestProfile(TestCase):
@@ -109,6 +166,7 @@ class TestNewPost(TestCase):
         self.assertContains(response_index, self.post.text)
 
 
+@RUN_ON_COMMIT
 class TestPostEdit(TestCase):
     """Класс для проверки редактирования поста."""
 
@@ -177,6 +235,7 @@ class TestPostErrors(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+@RUN_ON_COMMIT
 class TestPostImages(TestCase):
     """Класс тестирования изображений."""
 
@@ -255,6 +314,7 @@ class TestPostImages(TestCase):
         self.assertNotContains(response, '<img')
 
 
+@RUN_ON_COMMIT
 class TestCache(TestCase):
     """Класс для проверки кеширования."""
 
@@ -266,19 +326,24 @@ class TestCache(TestCase):
                                              password='skywockerisjedi')
         self.client.force_login(self.user)
         self.post = Post.objects.create(text='TEST_POST_1', author=self.user)
+        cache.clear()
 
     def test_index_cache(self):
         """
         Тест кеширования.
 
-        Проверяется, что на странице есть пост 1 и нет поста 2.
-        Редактируем пост.
-        Проверяем вывод главной страницы. Там не отредактированный пост.
-        Ждем больше чем в кеше указано времени
+        Проверяется, что на странице есть пост 1.
+        Меняем текст в базе в обход сигналов. Проверяем вывод главной
+        страницы. Там закешированный пост 1.
+        Редактируем пост. Кеш сбрасывается сразу, ждать не нужно.
 
         """
         url_index = reverse('index')
         response_url_index = self.client.get(url_index)
+        self.assertContains(response_url_index, 'TEST_POST_1')
+
+        Post.objects.filter(pk=self.post.pk).update(text='TEST_POST_2')
+        response_url_index = self.client.get(url_index)
         self.assertNotContains(response_url_index, 'TEST_POST_2')
         self.assertContains(response_url_index, 'TEST_POST_1')
 
@@ -286,21 +351,29 @@ class TestCache(TestCase):
                                 kwargs={'username': self.user.username,
                                         'post_id': self.post.id})
         response_url_post_edit = self.client.post(url_post_edit,
-                                                  {'text': 'TEST_POST_2'},
+                                                  {'text': 'TEST_POST_3'},
                                                   follow=True)
         self.assertEqual(response_url_post_edit.status_code, 200)
 
-        url_index = reverse('index')
         response_url_index = self.client.get(url_index)
-        self.assertNotContains(response_url_index, 'TEST_POST_2')
-        self.assertContains(response_url_index, 'TEST_POST_1')
+        self.assertNotContains(response_url_index, 'TEST_POST_1')
+        self.assertContains(response_url_index, 'TEST_POST_3')
 
-        time.sleep(20)
+    def test_comment_invalidates_post_page(self):
+        """Тест сброса кеша страниц поста и профиля новым комментарием."""
+        url_post_view = reverse('post_view',
+                                kwargs={'username': self.user.username,
+                                        'post_id': self.post.id})
+        url_profile = reverse('profile',
+                              kwargs={'username': self.user.username})
+        self.assertNotContains(self.client.get(url_profile),
+                               '1 комментариев')
+        self.assertNotContains(self.client.get(url_post_view), 'Comment 1')
 
-        url_index = reverse('index')
-        response_url_index = self.client.get(url_index)
-        self.assertNotContains(response_url_index, 'TEST_POST_1')
-        self.assertContains(response_url_index, 'TEST_POST_2')
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Comment 1')
+        self.assertContains(self.client.get(url_profile), '1 комментариев')
+        self.assertContains(self.client.get(url_post_view), 'Comment 1')
 
 
 class TestFollow(TestCase):
@@ -392,6 +465,47 @@ class TestFollow(TestCase):
         self.assertContains(response_profile, 'TEST_POST_1')
 
 
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'generations'}})
+class TestGenerationsOnCommit(TestCase):
+    """Класс проверки смены поколений кеша после фиксации."""
+
+    def test_bump_after_commit(self):
+        """Пока транзакция не зафиксирована, поколение прежнее."""
+        user = User.objects.create_user(username='skywocker1')
+        before = generations(ALL_POSTS)
+        with mock.patch('posts.signals.transaction') as transaction:
+            Post.objects.create(text='TEST_POST_1', author=user)
+        self.assertEqual(generations(ALL_POSTS), before)
+        for call in transaction.on_commit.call_args_list:
+            call[0][0]()
+        self.assertNotEqual(generations(ALL_POSTS), before)
+
+    @override_settings(POSTS_REPLICAS=['replica'], POSTS_TASKS_EAGER=False)
+    @RUN_ON_COMMIT
+    def test_bump_again_after_replica_lag(self):
+        """
+        Тест повторной смены поколений при репликах.
+
+        Кроме сброса сразу после фиксации ставится такой же сброс через
+        окно репликации: он убирает HTML, сохраненный по отстающей
+        реплике под новым поколением.
+
+        """
+        user = User.objects.create_user(username='skywocker1')
+        Task.objects.all().delete()
+        started = timezone.now()
+        Post.objects.create(text='TEST_POST_1', author=user)
+        run_at = list(Task.objects.filter(name='bump').values_list(
+            'run_at', flat=True))
+        self.assertEqual(len(run_at), 2)
+        self.assertLess(min(run_at), started + dt.timedelta(seconds=1))
+        self.assertGreaterEqual(
+            max(run_at), started + dt.timedelta(seconds=REPLICA_PIN_SECONDS))
+
+
+@RUN_ON_COMMIT
 class TestComment(TestCase):
     """Класс тестирования комментариев."""
 
@@ -437,3 +551,1440 @@ class TestComment(TestCase):
         response_comment = self.client.post(url_comment, {'text': 'Comment 1'},
                                             follow=True)
         self.assertContains(response_comment, 'Comment 1')
+
+    def test_comment_without_author(self):
+        """
+        Тест старого комментария без автора.
+
+        Такие комментарии остались в базе от прежних миграций; страница
+        поста и API показывают их, а не падают.
+
+        """
+        Comment.objects.create(post=self.post, author=None, text='Comment 0')
+        response = self.client.get(reverse(
+            'post_view', args=[self.user1.username, self.post.id]))
+        self.assertContains(response, 'Comment 0')
+        response = self.client.get(reverse(
+            'api_post_view', args=[self.user1.username, self.post.id]))
+        self.assertIsNone(
+            response.json()['comments']['results'][0]['author'])
+
+
+class TestCursorPaginator(TestCase):
+    """Класс тестирования курсорной пагинации."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='skywocker1',
+                                             email='l.skywocker@dethstar.com',
+                                             password='skywockerisjedi')
+        Post.objects.bulk_create(
+            Post(text=f'TEST_POST_{i}', author=self.user) for i in range(25))
+        self.url_index = reverse('index')
+
+    @override_settings(CACHES=DUMMY_CACHE)
+    def test_walk_pages(self):
+        """
+        Тест обхода ленты по курсорам.
+
+        Проходим ленту вперед до конца и обратно. Проверяется, что посты не
+        теряются и не повторяются, а запросы не содержат COUNT и OFFSET.
+
+        """
+        seen = []
+        cursor = None
+        with CaptureQueriesContext(connection) as queries:
+            while True:
+                response = self.client.get(self.url_index,
+                                           {'cursor': cursor or ''})
+                page = response.context['page']
+                seen.extend(post.id for post in page)
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        self.assertEqual(page.number, 3)
+        for query in queries.captured_queries:
+            if 'FROM "posts_post"' in query['sql']:
+                self.assertNotIn('COUNT(*)', query['sql'])
+                self.assertNotIn('OFFSET', query['sql'])
+
+        response = self.client.get(self.url_index,
+                                   {'cursor': page.previous_cursor})
+        page = response.context['page']
+        self.assertEqual(page.number, 2)
+        self.assertEqual([post.id for post in page], seen[10:20])
+
+    @override_settings(CACHES=DUMMY_CACHE)
+    def test_bad_cursor(self):
+        """Тест испорченного курсора: отдается первая страница."""
+        response = self.client.get(self.url_index, {'cursor': 'garbage'})
+        page = response.context['page']
+        self.assertEqual(page.number, 1)
+        self.assertIsNone(page.previous_cursor)
+        self.assertEqual(len(page), 10)
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class TestFeedQueries(TestCase):
+    """Класс проверки числа запросов в лентах."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='skywocker1',
+                                             email='l.skywocker@dethstar.com',
+                                             password='skywockerisjedi')
+        self.group = Group.objects.create(title='harvester',
+                                          description='harvester',
+                                          slug='harvester')
+
+    def create_posts(self, count):
+        """Создать посты с группой и комментарием."""
+        for i in range(count):
+            post = Post.objects.create(text=f'TEST_POST_{i}',
+                                       author=self.user, group=self.group)
+            Comment.objects.create(post=post, author=self.user,
+                                   text=f'Comment {i}')
+
+    def count_queries(self, url):
+        """Число запросов при отрисовке страницы."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_budget(self):
+        """
+        Тест числа запросов на страницу ленты.
+
+        Число запросов для страницы с одним постом и с десятью постами
+        должно совпадать.
+
+        """
+        urls = (reverse('index'),
+                reverse('group_view', kwargs={'slug': self.group.slug}),
+                reverse('profile', kwargs={'username': self.user.username}))
+        self.create_posts(1)
+        single = [self.count_queries(url) for url in urls]
+        self.create_posts(9)
+        full = [self.count_queries(url) for url in urls]
+        self.assertEqual(single, full)
+        self.assertLessEqual(full[0], 1)
+
+
+class TestCounters(TestCase):
+    """Класс тестирования денормализованных счетчиков."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.client = Client()
+        self.user1 = User.objects.create_user(username='skywocker1',
+                                              email='l.skywocker@dethstar.com',
+                                              password='skywockerisjedi')
+        self.user2 = User.objects.create_user(username='skywocker2',
+                                              email='l.skywocker@dethstar.com',
+                                              password='skywockerisjedi')
+        self.client.force_login(self.user1)
+
+    def test_counters(self):
+        """
+        Тест обновления счетчиков.
+
+        Создаем пост, комментарий и подписку, затем отписываемся.
+        Проверяется, что счетчики меняются вместе с данными.
+
+        """
+        self.client.post(reverse('new_post'), {'text': 'TEST_POST_1'})
+        post = Post.objects.get()
+        self.client.post(reverse('add_comment',
+                                 kwargs={'username': self.user1.username,
+                                         'post_id': post.id}),
+                         {'text': 'Comment 1'})
+        self.client.get(reverse('profile_follow',
+                                kwargs={'username': self.user2.username}))
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(UserStats.objects.get(user=self.user1).posts_count,
+                         1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user1).following_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user2).followers_count, 1)
+
+        self.client.get(reverse('profile_unfollow',
+                                kwargs={'username': self.user2.username}))
+        self.assertEqual(
+            UserStats.objects.get(user=self.user2).followers_count, 0)
+        post.delete()
+        self.assertEqual(UserStats.objects.get(user=self.user1).posts_count,
+                         0)
+
+    def test_rebuild_counters(self):
+        """Тест команды пересчета счетчиков после массовой вставки."""
+        Post.objects.bulk_create(
+            Post(text=f'TEST_POST_{i}', author=self.user2) for i in range(3))
+        Follow.objects.bulk_create([Follow(user=self.user1,
+                                           author=self.user2)])
+        call_command('rebuild_counters', stdout=StringIO())
+        stats = UserStats.objects.get(user=self.user2)
+        self.assertEqual(stats.posts_count, 3)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user1).following_count, 1)
+
+
+class TestTimeline(TestCase):
+    """Класс тестирования материализованной ленты подписок."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.client = Client()
+        self.user1 = User.objects.create_user(username='skywocker1',
+                                              email='l.skywocker@dethstar.com',
+                                              password='skywockerisjedi')
+        self.user2 = User.objects.create_user(username='skywocker2',
+                                              email='l.skywocker@dethstar.com',
+                                              password='skywockerisjedi')
+        self.client.force_login(self.user1)
+        self.old_post = Post.objects.create(text='TEST_POST_1',
+                                            author=self.user2)
+
+    def test_fan_out(self):
+        """
+        Тест раскладки постов по лентам.
+
+        При подписке старые посты автора попадают в ленту, новые посты
+        раскладываются при создании, при отписке лента очищается.
+
+        """
+        Follow.objects.create(user=self.user1, author=self.user2)
+        new_post = Post.objects.create(text='TEST_POST_2', author=self.user2)
+        entries = TimelineEntry.objects.filter(user=self.user1)
+        self.assertEqual(
+            set(entries.values_list('post_id', flat=True)),
+            {self.old_post.id, new_post.id})
+        response = self.client.get(reverse('follow_index'))
+        self.assertContains(response, 'TEST_POST_2')
+
+        Follow.objects.filter(user=self.user1).delete()
+        self.assertFalse(entries.exists())
+        response = self.client.get(reverse('follow_index'))
+        self.assertNotContains(response, 'TEST_POST_1')
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 0)
+    def test_fan_out_on_read(self):
+        """Тест чтения постов популярного автора без раскладки по лентам."""
+        Follow.objects.create(user=self.user1, author=self.user2)
+        Post.objects.create(text='TEST_POST_2', author=self.user2)
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.client.get(reverse('follow_index'))
+        self.assertContains(response, 'TEST_POST_1')
+        self.assertContains(response, 'TEST_POST_2')
+
+    @mock.patch('posts.timeline.TIMELINE_LENGTH', 2)
+    def test_trim_timelines(self):
+        """
+        Тест обрезки лент.
+
+        Раскладка нового поста не обрезает ленту, это делает
+        периодическая команда trim_timelines.
+
+        """
+        Follow.objects.create(user=self.user1, author=self.user2)
+        posts = [Post.objects.create(text=f'TEST_POST_{i}', author=self.user2)
+                 for i in range(2, 5)]
+        entries = TimelineEntry.objects.filter(user=self.user1)
+        self.assertEqual(entries.count(), 4)
+        call_command('trim_timelines', stdout=StringIO())
+        self.assertEqual(set(entries.values_list('post_id', flat=True)),
+                         {post.id for post in posts[-2:]})
+
+    def test_no_duplicates_over_limit(self):
+        """Записи автора, ставшего популярным, не дублируют его посты."""
+        Follow.objects.create(user=self.user1, author=self.user2)
+        UserStats.objects.filter(user=self.user2).update(followers_count=5000)
+        page = TimelinePaginator(self.user1).get_page()
+        self.assertEqual([post.id for post in page], [self.old_post.id])
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 1)
+    def test_cross_fanout_limit(self):
+        """
+        Тест перехода автора через порог раскладки.
+
+        Ставший популярным автор убирается из лент, а вернувшийся под
+        порог раскладывается заново вместе с постами, написанными за
+        время популярности.
+
+        """
+        user3 = User.objects.create_user(username='skywocker3')
+        Follow.objects.create(user=self.user1, author=self.user2)
+        entries = TimelineEntry.objects.filter(user=self.user1)
+        self.assertTrue(entries.exists())
+        Follow.objects.create(user=user3, author=self.user2)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        popular_post = Post.objects.create(text='TEST_POST_2',
+                                           author=self.user2)
+        Follow.objects.filter(user=user3).delete()
+        self.assertEqual(set(entries.values_list('post_id', flat=True)),
+                         {self.old_post.id, popular_post.id})
+
+    def test_merge_popular_authors(self):
+        """Лента сливает разложенные посты и посты популярных авторов."""
+        user3 = User.objects.create_user(username='skywocker3')
+        Follow.objects.create(user=self.user1, author=self.user2)
+        Follow.objects.create(user=self.user1, author=user3)
+        UserStats.objects.filter(user=user3).update(followers_count=10 ** 6)
+        expected = []
+        for i in range(6):
+            author = (self.user2, user3)[i % 2]
+            expected.append(Post.objects.create(text=f'MERGED_{i}',
+                                                author=author))
+        expected = [self.old_post] + expected
+        seen, token = [], None
+        paginator = TimelinePaginator(self.user1, per_page=3)
+        while True:
+            page = paginator.get_page(token)
+            seen += list(page)
+            token = page.next_cursor
+            if not token:
+                break
+        self.assertEqual(seen, expected[::-1])
+        self.assertEqual(
+            list(paginator.get_page(page.previous_cursor)), expected[1:4][::-1])
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class TestQueryPlans(TestCase):
+    """Класс проверки планов запросов лент."""
+
+    FULL_SCAN = re.compile(r'^SCAN (TABLE )?(posts_\w+)$')
+    TEMP_SORT = 'USE TEMP B-TREE'
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.client = Client()
+        self.user1 = User.objects.create_user(username='skywocker1',
+                                              email='l.skywocker@dethstar.com',
+                                              password='skywockerisjedi')
+        self.user2 = User.objects.create_user(username='skywocker2',
+                                              email='l.skywocker@dethstar.com',
+                                              password='skywockerisjedi')
+        self.group = Group.objects.create(title='harvester',
+                                          description='harvester',
+                                          slug='harvester')
+        Follow.objects.create(user=self.user1, author=self.user2)
+        for i in range(3):
+            self.post = Post.objects.create(text=f'TEST_POST_{i}',
+                                            author=self.user2,
+                                            group=self.group)
+            Comment.objects.create(post=self.post, author=self.user1,
+                                   text=f'Comment {i}')
+        self.client.force_login(self.user1)
+
+    def full_scans(self, url):
+        """
+        Таблицы posts, которые запросы страницы читают целиком.
+
+        Сортировка во временном B-дереве тоже считается полным чтением:
+        ее нельзя остановить на LIMIT, и она попадает в результат как
+        строка плана.
+
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            if 'page' in response.context:
+                cursor = CursorPaginator(Post.objects.all()).encode(
+                    response.context['page'][0], NEXT, 2)
+                self.client.get(url, {'cursor': cursor})
+        scans = set()
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                for row in cursor.fetchall():
+                    match = self.FULL_SCAN.match(row[-1])
+                    if match:
+                        scans.add(match.group(2))
+                    elif row[-1].startswith(self.TEMP_SORT):
+                        scans.add(row[-1])
+        return scans
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN SQLite')
+    def test_no_full_scans(self):
+        """
+        Тест планов запросов.
+
+        Для каждой ленты и страницы поста выполняется EXPLAIN QUERY PLAN.
+        Проверяется, что ни одна таблица posts не читается целиком и ни
+        одна выборка не сортируется во временном B-дереве.
+
+        """
+        urls = (
+            reverse('index'),
+            reverse('group_view', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user2.username}),
+            reverse('post_view', kwargs={'username': self.user2.username,
+                                         'post_id': self.post.id}),
+            reverse('follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.full_scans(url), set())
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'post-cards'}})
+@RUN_ON_COMMIT
+class TestPostCards(TestCase):
+    """Класс тестирования кеша карточек постов."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.user1 = User.objects.create_user(username='skywocker1',
+                                              email='l.skywocker@dethstar.com',
+                                              password='skywockerisjedi')
+        self.user2 = User.objects.create_user(username='skywocker2',
+                                              email='l.skywocker@dethstar.com',
+                                              password='skywockerisjedi')
+        for i in range(3):
+            Post.objects.create(text=f'TEST_POST_{i}', author=self.user1)
+        self.template = Template('{% load post_cards %}{% post_cards posts %}')
+
+    def render(self, user):
+        """Отрисовать карточки всех постов и вставки для пользователя."""
+        request = RequestFactory().get('/')
+        request.user = user
+        posts = Post.objects.feed()
+        return fill_holes(request,
+                          self.template.render(Context({'posts': posts})))
+
+    def test_cards_cached(self):
+        """
+        Тест кеша карточек.
+
+        Повторная отрисовка не рендерит post_item.html даже для другого
+        читателя, вставки у автора и читателя различаются, изменение
+        поста обновляет его карточку.
+
+        """
+        html = self.render(self.user2)
+        self.assertNotIn('Редактировать', html)
+        self.assertIn('Редактировать', self.render(self.user1))
+        with self.assertTemplateNotUsed('post_item.html'):
+            self.assertEqual(self.render(self.user2), html)
+            self.assertIn('Редактировать', self.render(self.user1))
+
+        post = Post.objects.first()
+        post.text = 'TEST_POST_EDITED'
+        post.save()
+        self.assertIn('TEST_POST_EDITED', self.render(self.user2))
+
+    def test_rename_author_and_group(self):
+        """
+        Тест ключей карточек при переименовании.
+
+        Карточки показывают username автора и название группы, поэтому
+        переименование пользователя или группы обновляет карточки, хотя
+        сами посты не менялись.
+
+        """
+        group = Group.objects.create(title='harvester', slug='harvester')
+        Post.objects.update(group=group)
+        self.render(self.user2)
+
+        self.user1.username = 'skywocker_renamed'
+        self.user1.save()
+        self.assertIn('skywocker_renamed', self.render(self.user2))
+        group.title = 'combine'
+        group.save()
+        self.assertIn('#combine', self.render(self.user2))
+
+
+class TestThumbnails(TestCase):
+    """Класс тестирования подготовки миниатюр."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(self.media_root, 'posts'))
+        shutil.copy(f'{BASE_DIR}/posts/tests/test_media/Korra.jpg',
+                    os.path.join(self.media_root, 'posts'))
+        cache.clear()
+
+    def test_generate_thumbnails(self):
+        """Тест генерации миниатюр картинки в хранилище."""
+        self.assertTrue(generate_thumbnails('posts/Korra.jpg'))
+        self.assertTrue(os.path.isdir(os.path.join(self.media_root,
+                                                   'cache')))
+
+    def test_schedule_after_commit(self):
+        """Тест постановки миниатюр в очередь только после фиксации."""
+        user = User.objects.create_user(username='skywocker1',
+                                        password='skywockerisjedi')
+        post = Post.objects.create(text='TEST_POST_1', author=user,
+                                   image='posts/Korra.jpg')
+        with mock.patch('posts.thumbnails._executor') as executor:
+            with mock.patch('posts.thumbnails.transaction.on_commit',
+                            side_effect=lambda func: func()) as on_commit:
+                schedule_thumbnails(post)
+        on_commit.assert_called_once()
+        executor.submit.assert_called_once_with(generate_in_thread,
+                                                'posts/Korra.jpg')
+
+    def test_pregenerate_skips_derivatives(self):
+        """Команда не готовит миниатюры постам с производными картинки."""
+        user = User.objects.create_user(username='skywocker1')
+        Post.objects.create(text='TEST_POST_1', author=user,
+                            image='posts/Korra.jpg')
+        Post.objects.create(text='TEST_POST_2', author=user,
+                            image='posts/Derived.jpg',
+                            image_derivatives='posts/derivatives/a.jpg 960')
+        with mock.patch(
+                'posts.management.commands.pregenerate_thumbnails.'
+                'generate_in_thread', return_value=True) as generate:
+            call_command('pregenerate_thumbnails', workers=1,
+                         stdout=StringIO())
+        generate.assert_called_once_with('posts/Korra.jpg')
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class TestImageNormalization(TestCase):
+    """Класс тестирования обработки загруженных картинок."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client()
+        self.user = User.objects.create_user(username='skywocker1',
+                                             password='skywockerisjedi')
+        self.client.force_login(self.user)
+
+    @mock.patch('posts.images.IMAGE_MAX_SIDE', 200)
+    def test_upload_normalized(self):
+        """
+        Тест нормализации картинки.
+
+        Оригинал сохраняется прогрессивным JPEG без EXIF с ограниченным
+        размером, для карточки готовятся JPEG и WebP, страница отдает их
+        через srcset.
+
+        """
+        with open(f'{BASE_DIR}/posts/tests/test_media/Korra.jpg',
+                  'rb') as img:
+            self.client.post(reverse('new_post'),
+                             {'text': 'TEST_POST_1', 'image': img})
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as stored:
+            self.assertLessEqual(max(stored.size), 200)
+            self.assertEqual((post.image_width, post.image_height),
+                             stored.size)
+            self.assertTrue(stored.info.get('progressive'))
+            self.assertNotIn('exif', stored.info)
+        derivatives = post.image_derivatives.splitlines()
+        self.assertEqual(len(derivatives), 4)
+        for line in derivatives:
+            name = line.rsplit(' ', 1)[0]
+            self.assertTrue(post.image.storage.exists(name))
+
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'image/webp')
+        self.assertContains(response, '960w')
+
+    def upload(self, post):
+        """Форма поста post с новой картинкой Korra.jpg."""
+        with open(f'{BASE_DIR}/posts/tests/test_media/Korra.jpg',
+                  'rb') as img:
+            upload = SimpleUploadedFile('Korra.jpg', img.read())
+        form = PostForm({'text': post.text}, {'image': upload},
+                        instance=post)
+        self.assertTrue(form.is_valid())
+        return form
+
+    @mock.patch('posts.forms.transaction', mock.Mock(
+        atomic=transaction.atomic, on_commit=lambda func: func()))
+    def test_replace_image(self):
+        """
+        Тест файлов производных при замене картинки.
+
+        Новая картинка удаляет файлы прежних производных после
+        сохранения, а неудачное сохранение не оставляет новых файлов.
+
+        """
+        post = Post.objects.create(text='TEST_POST_1', author=self.user)
+        post = self.upload(post).save()
+        storage = post.image.storage
+        old = derivative_names(post.image_derivatives)
+        post = self.upload(Post.objects.get(pk=post.pk)).save()
+        new = derivative_names(post.image_derivatives)
+        self.assertFalse(any(storage.exists(name) for name in old))
+        self.assertTrue(all(storage.exists(name) for name in new))
+
+        form = self.upload(Post.objects.get(pk=post.pk))
+        with mock.patch.object(Post, 'save', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                form.save()
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.media_root,
+                                           DERIVATIVES_DIR))),
+            sorted(os.path.basename(name) for name in new))
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class TestSearch(TestCase):
+    """Класс тестирования полнотекстового поиска."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='skywocker1',
+                                             password='skywockerisjedi')
+        self.post1 = Post.objects.create(text='Джедаи сражаются на мечах',
+                                         author=self.user)
+        self.post2 = Post.objects.create(text='Ситх тоже сражался',
+                                         author=self.user)
+        Comment.objects.create(post=self.post2, author=self.user,
+                               text='У него красный меч')
+
+    def check_search(self):
+        """Проверить поиск через страницу /search/."""
+        url = reverse('search')
+        response = self.client.get(url, {'q': 'мечи'})
+        self.assertEqual({post.id for post in response.context['page']},
+                         {self.post1.id, self.post2.id})
+        response = self.client.get(url, {'q': 'сражаться ситхи'})
+        self.assertEqual([post.id for post in response.context['page']],
+                         [self.post2.id])
+        # Слова из текста поста и из его комментария.
+        self.assertEqual(search_post_ids('ситх красный', 10),
+                         [self.post2.id])
+        self.assertEqual(search_post_ids('джедаи красный', 10), [])
+        response = self.client.get(url, {'q': 'бластер'})
+        self.assertContains(response, 'Ничего не найдено')
+
+        self.post2.delete()
+        self.assertEqual(search_post_ids('мечи', 10), [self.post1.id])
+
+    def test_search_fts(self):
+        """
+        Тест поиска через SQLite FTS5.
+
+        Поиск учитывает формы слов и текст комментариев, слова запроса
+        могут быть в разных документах поста, удаленный пост пропадает
+        из индекса.
+
+        """
+        self.assertEqual(backend(), 'fts5')
+        self.check_search()
+
+    @mock.patch('posts.search.SEARCH_BACKEND', 'postings')
+    def test_search_postings(self):
+        """Тест поиска через таблицу SearchPosting."""
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertTrue(SearchPosting.objects.exists())
+        self.check_search()
+
+
+@RUN_ON_COMMIT
+class TestApi(TestCase):
+    """Класс тестирования JSON API."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        cache.clear()
+        self.client = Client()
+        self.user1 = User.objects.create_user(username='skywocker1',
+                                              password='skywockerisjedi')
+        self.user2 = User.objects.create_user(username='skywocker2',
+                                              password='skywockerisjedi')
+        self.group = Group.objects.create(title='harvester',
+                                          description='harvester',
+                                          slug='harvester')
+        self.post = Post.objects.create(text='TEST_POST_1',
+                                        author=self.user2, group=self.group)
+        Comment.objects.create(post=self.post, author=self.user1,
+                               text='Comment 1')
+
+    def test_feeds(self):
+        """Тест содержимого лент и поста."""
+        response = self.client.get(reverse('api_index'))
+        self.assertEqual(response.json()['results'][0]['text'],
+                         'TEST_POST_1')
+        self.assertEqual(response.json()['results'][0]['comments'], 1)
+        response = self.client.get(reverse('api_group',
+                                           kwargs={'slug': 'harvester'}))
+        self.assertEqual(len(response.json()['results']), 1)
+        response = self.client.get(
+            reverse('api_post_view',
+                    kwargs={'username': self.user2.username,
+                            'post_id': self.post.id}))
+        self.assertEqual(response.json()['comments']['results'][0]['text'],
+                         'Comment 1')
+        response = self.client.get(reverse('api_follow_index'))
+        self.assertEqual(response.status_code, 401)
+        self.client.force_login(self.user1)
+        Follow.objects.create(user=self.user1, author=self.user2)
+        response = self.client.get(reverse('api_follow_index'))
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_conditional_get(self):
+        """
+        Тест условного GET.
+
+        Для совпадающего ETag возвращается 304 без запросов к базе,
+        после правки поста ETag меняется.
+
+        """
+        url = reverse('api_index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.post.text = 'TEST_POST_2'
+        self.post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class TestTransfer(TestCase):
+    """Класс тестирования выгрузки и загрузки данных."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.user1 = User.objects.create_user(username='skywocker1',
+                                              password='skywockerisjedi')
+        self.user2 = User.objects.create_user(username='skywocker2',
+                                              password='skywockerisjedi')
+        group = Group.objects.create(title='harvester',
+                                     description='harvester',
+                                     slug='harvester')
+        self.post = Post.objects.create(text='TEST_POST_1',
+                                        author=self.user1, group=group)
+        Comment.objects.create(post=self.post, author=self.user2,
+                               text='Comment 1')
+        Follow.objects.create(user=self.user2, author=self.user1)
+        self.path = os.path.join(tempfile.mkdtemp(), 'export.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.path))
+
+    def test_export_import(self):
+        """
+        Тест выгрузки и загрузки.
+
+        Выгружаем данные, очищаем базу и пользователя-автора, загружаем
+        обратно маленькими пакетами. Проверяется, что строки, даты и
+        счетчики восстановлены, а автор создан заново.
+
+        """
+        call_command('export_posts', self.path, stderr=StringIO())
+        with open(self.path, encoding='utf-8') as file:
+            self.assertEqual(len(file.readlines()), 4)
+        pub_date = self.post.pub_date
+        Group.objects.all().delete()
+        self.user1.delete()
+
+        stderr = StringIO()
+        call_command('import_posts', self.path, batch_size=1, stderr=stderr)
+        self.assertIn('строк/с', stderr.getvalue())
+        post = Post.objects.get()
+        self.assertEqual(post.pub_date, pub_date)
+        self.assertEqual(post.author.username, 'skywocker1')
+        self.assertEqual(post.group.slug, 'harvester')
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(Follow.objects.get().author, post.author)
+        self.assertEqual(post.author.stats.followers_count, 1)
+
+    def test_import_into_existing(self):
+        """
+        Тест загрузки в базу, где уже есть строки с теми же id.
+
+        Местный пост с id выгруженного не перезаписывается и не получает
+        чужой комментарий; загруженный пост получает новый id, группу с
+        тем же slug и свой комментарий. Уже существующие группа и
+        подписка не создаются и не учитываются в отчете.
+
+        """
+        call_command('export_posts', self.path, stderr=StringIO())
+        self.post.delete()
+        local = Post.objects.create(pk=self.post.pk, text='LOCAL_POST',
+                                    author=self.user2)
+
+        stderr = StringIO()
+        call_command('import_posts', self.path, stderr=stderr)
+        for line in ('group: 0', 'post: 1', 'comment: 1', 'follow: 0'):
+            self.assertIn(line, stderr.getvalue())
+        local.refresh_from_db()
+        self.assertEqual(local.text, 'LOCAL_POST')
+        self.assertFalse(local.post_comment.exists())
+        post = Post.objects.exclude(pk=local.pk).get()
+        self.assertEqual(post.text, 'TEST_POST_1')
+        self.assertEqual(post.group, Group.objects.get())
+        self.assertEqual(post.post_comment.get().text, 'Comment 1')
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_keep_referenced_ids_only(self):
+        """Импорт запоминает соответствие id только групп и постов."""
+        call_command('export_posts', self.path, stderr=StringIO())
+        importer = Importer(batch_size=1)
+        with open(self.path, encoding='utf-8') as file:
+            for line in file:
+                importer.add(line)
+        importer.finish()
+        self.assertEqual({label: len(ids) for label, ids in
+                          importer.ids.items()}, {'group': 1, 'post': 1})
+        self.assertEqual(importer.counts['comment'], 1)
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class TestLoadBenchmark(TestCase):
+    """Класс тестирования генератора данных и замера страниц."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_generate_and_benchmark(self):
+        """
+        Тест генерации данных и замера.
+
+        Генератор создает связанные данные с пересчитанными счетчиками,
+        замер обходит все маршруты, пишет отчет в JSON и не оставляет
+        подписок, созданных страницами follow.
+
+        """
+        call_command('generate_load_data', users=5, groups=2, posts=20,
+                     comments=30, follows=10, images=1, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertTrue(Post.objects.exclude(image='').get().srcset('jpg'))
+        self.assertEqual(
+            sum(UserStats.objects.values_list('posts_count', flat=True)), 20)
+        follows = Follow.objects.count()
+
+        path = os.path.join(self.media_root, 'bench.json')
+        call_command('benchmark_views', requests=2, output=path,
+                     stdout=StringIO())
+        with open(path, encoding='utf-8') as file:
+            report = json.load(file)
+        for name in ('index', 'profile', 'post_view', 'post_edit',
+                     'group_view', 'follow_index', 'signup'):
+            self.assertEqual(report['routes'][name]['status'], 200, name)
+        self.assertIn('p99_ms', report['routes']['index'])
+        self.assertEqual(Follow.objects.count(), follows)
+
+    def test_rollback_only_write_routes(self):
+        """
+        Тест границ транзакций замера.
+
+        Читающие страницы замеряются без своей транзакции, чтобы
+        заполнение кеша после фиксации срабатывало, а подписка
+        и отписка - в транзакции, которая откатывается.
+
+        """
+        user = User.objects.create_user(username='skywocker1')
+        Post.objects.create(text='TEST_POST_1', author=user)
+        depth = len(connection.savepoint_ids)
+        depths = {}
+
+        def measure(client, url, requests):
+            depths[url] = len(connection.savepoint_ids) - depth
+            return {}
+
+        with mock.patch('posts.benchmark.measure', measure):
+            benchmark.run(requests=1)
+        self.assertEqual(depths[reverse('index')], 0)
+        self.assertEqual(depths[reverse('profile', args=[user])], 0)
+        self.assertEqual(depths[reverse('profile_follow', args=[user])], 1)
+        self.assertEqual(depths[reverse('profile_unfollow', args=[user])], 1)
+
+
+class TestMetrics(TestCase):
+    """Класс тестирования метрик запросов."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        cache.clear()
+        registry.reset()
+        self.client = Client()
+        self.user = User.objects.create_user(username='skywocker1',
+                                             password='skywockerisjedi')
+        self.staff = User.objects.create_user(username='admin',
+                                              password='skywockerisjedi',
+                                              is_staff=True)
+        Post.objects.create(text='TEST_POST_1', author=self.user)
+
+    @mock.patch('posts.metrics.SLOW_REQUEST_SECONDS', 0)
+    def test_metrics_endpoint(self):
+        """
+        Тест сбора метрик.
+
+        Запросы главной учитываются в гистограммах и счетчиках кеша,
+        медленные попадают в буфер с SQL, а сами метрики видны только
+        персоналу.
+
+        """
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(self.staff)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="index"} 2', body)
+        self.assertIn('yatube_db_queries_bucket{view="index",le="+Inf"} 2',
+                      body)
+        self.assertRegex(body, r'yatube_cache_hits_total\{view="index"\} [1-9]')
+        self.assertRegex(
+            body, r'yatube_template_duration_seconds_sum\{view="index"\} '
+                  r'0\.0*[1-9]')
+
+        slow = self.client.get(reverse('slow_requests')).json()['requests']
+        self.assertEqual(slow[-1]['view'], 'index')
+        self.assertTrue(any('posts_post' in query['sql']
+                            for query in slow[-1]['queries']))
+
+
+class TestSqliteBackend(TestCase):
+    """Класс тестирования настроек бэкенда SQLite."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.settings_dict = {**connection.settings_dict,
+                              'NAME': os.path.join(directory, 'db.sqlite3')}
+
+    def open(self, **options):
+        """Отдельное подключение к файлу базы."""
+        settings_dict = {**self.settings_dict, 'OPTIONS': {
+            **self.settings_dict['OPTIONS'], **options}}
+        wrapper = DatabaseWrapper(settings_dict, alias='tuning')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas(self):
+        """Тест прагм: WAL, synchronous=NORMAL и busy_timeout."""
+        with self.open(busy_timeout=1234).cursor() as cursor:
+            pragmas = {}
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {pragma}')
+                pragmas[pragma] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1,
+                                   'busy_timeout': 1234})
+
+    def test_locked_write_retried(self):
+        """
+        Тест повтора записи при занятой базе.
+
+        Пока другое подключение держит BEGIN IMMEDIATE, запись падает
+        только после исчерпания повторов; повтор после освобождения
+        блокировки проходит.
+
+        """
+        writer = self.open()
+        with writer.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id integer)')
+        other = self.open(busy_timeout=0, write_retries=2,
+                          write_retry_delay=0.01)
+        writer._start_transaction_under_autocommit()
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            with mock.patch('time.sleep') as sleep:
+                other.cursor().execute('INSERT INTO item VALUES (1)')
+        self.assertEqual(sleep.call_count, 2)
+
+        def release(delay):
+            writer.connection.commit()
+
+        with mock.patch('time.sleep', side_effect=release):
+            other.cursor().execute('INSERT INTO item VALUES (1)')
+        with other.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+@override_settings(CACHES=DUMMY_CACHE, POSTS_REPLICAS=['replica'])
+class TestReplicas(TestCase):
+    """Класс тестирования чтения с реплики."""
+
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        """Реплика - файловая копия пустой тестовой базы."""
+        cls.directory = tempfile.mkdtemp()
+        path = os.path.join(cls.directory, 'replica.sqlite3')
+        connection.ensure_connection()
+        with sqlite3.connect(path) as replica:
+            connection.connection.backup(replica)
+        replica.close()
+        connections.databases['replica'] = {
+            **connection.settings_dict, 'NAME': path}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Убираем реплику."""
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='skywocker1',
+                                             password='skywockerisjedi')
+        self.author = User.objects.create_user(username='skywocker2',
+                                               password='skywockerisjedi')
+        Post.objects.create(text='TEST_POST_1', author=self.author)
+
+    def test_read_from_replica(self):
+        """
+        Тест маршрутизации чтения.
+
+        Пост есть только в основной базе: лента с реплики его не видит,
+        пока пользователь не закреплен за основной базой подпиской.
+
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('index'))
+        self.assertEqual(len(response.context['page']), 0)
+
+        response = self.client.get(reverse('profile_follow',
+                                           args=[self.author.username]))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'TEST_POST_1')
+        self.assertEqual(Follow.objects.using('replica').count(), 0)
+
+
+class TestSQLiteCache(TestCase):
+    """Класс тестирования общего кеша в SQLite."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+
+    def make_cache(self, **options):
+        """Экземпляр кеша, как в отдельном воркере."""
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_shared_operations(self):
+        """Тест операций и общего доступа двух экземпляров к файлу."""
+        first, second = self.make_cache(), self.make_cache()
+        first.set('key', {'value': 1})
+        first.set('short', 1, timeout=-1)
+        self.assertEqual(second.get('key'), {'value': 1})
+        self.assertIsNone(second.get('short'))
+        self.assertFalse(second.add('key', 2))
+        self.assertTrue(second.add('short', 2))
+        self.assertEqual(first.incr('short', 5), 7)
+        self.assertEqual(second.get_many(['key', 'short', 'none']),
+                         {'key': {'value': 1}, 'short': 7})
+        second.delete('key')
+        self.assertFalse(first.has_key('key'))
+
+    def test_lru_eviction(self):
+        """Тест вытеснения по объему давно не читанных записей."""
+        cache = self.make_cache(MAX_SIZE=3000, TOUCH_INTERVAL=0)
+        cache.set('old', 'x' * 1000)
+        cache.set('read', 'x' * 1000)
+        time.sleep(0.01)
+        cache.get('read')
+        cache.set('new', 'x' * 1000)
+        self.assertEqual(set(cache.get_many(['old', 'read', 'new'])),
+                         {'read', 'new'})
+
+    def test_get_or_set_single_flight(self):
+        """Пока значение вычисляет другой процесс, его результат ждут."""
+        first, second = self.make_cache(), self.make_cache()
+        first.add(f'key{LOCK_SUFFIX}', 1)
+
+        def computed_elsewhere(delay):
+            first.set('key', 'first')
+
+        compute = mock.Mock(return_value='second')
+        with mock.patch('time.sleep', side_effect=computed_elsewhere):
+            self.assertEqual(second.get_or_set('key', compute), 'first')
+        compute.assert_not_called()
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'fragment-cache'}})
+class TestFragmentCache(TestCase):
+    """Класс тестирования тега cache с защитой от пересборки."""
+
+    template = Template('{% load fragment_cache %}'
+                        '{% cache 60 fragment name version=version %}'
+                        '{{ text }}{% endcache %}')
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        cache.clear()
+        self.key = 'fresh:' + make_template_fragment_key('fragment',
+                                                         ['skywocker'])
+
+    def render(self, text, version):
+        """Отрисовать фрагмент."""
+        return self.template.render(Context({
+            'name': 'skywocker', 'text': text, 'version': version}))
+
+    def test_stale_served_while_rebuilding(self):
+        """
+        Тест одного пересчета.
+
+        Пока фрагмент новой версии собирает другой запрос, отдается
+        прежний HTML; после снятия блокировки фрагмент обновляется.
+
+        """
+        self.assertEqual(self.render('old', 1), 'old')
+        cache.add(f'{self.key}:lock', 1)
+        self.assertEqual(self.render('new', 2), 'old')
+        cache.delete(f'{self.key}:lock')
+        self.assertEqual(self.render('new', 2), 'new')
+        self.assertEqual(self.render('newer', 2), 'new')
+
+    @mock.patch('posts.templatetags.fragment_cache.random.random',
+                return_value=0.5)
+    def test_early_refresh(self, random):
+        """Долго собираемый фрагмент пересобирается до своего срока."""
+        cache.set(self.key, ('1', time.time() + 5, 0.0, 'fast'))
+        self.assertEqual(self.render('new', 1), 'fast')
+        cache.set(self.key, ('1', time.time() + 5, 10.0, 'slow'))
+        self.assertEqual(self.render('new', 1), 'new')
+
+
+@override_settings(CACHES=DUMMY_CACHE, POSTS_TASKS_EAGER=False)
+class TestTaskQueue(TestCase):
+    """Класс тестирования очереди фоновых задач."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.user = User.objects.create_user(username='skywocker1',
+                                             password='skywockerisjedi')
+        self.author = User.objects.create_user(username='skywocker2',
+                                               password='skywockerisjedi')
+        Task.objects.all().delete()
+
+    def test_side_effects_deferred(self):
+        """
+        Тест отложенных побочных эффектов.
+
+        Запись поста, подписки и комментария только ставит задачи;
+        счетчики и лента меняются, когда их выполнит воркер.
+
+        """
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='TEST_POST_1', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='Comment')
+        self.assertEqual(self.author.stats.followers_count, 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertTrue(Task.objects.exists())
+
+        call_command('run_tasks', once=True, stdout=StringIO())
+        self.assertFalse(Task.objects.exists())
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(self.author.stats.posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(list(TimelinePaginator(self.user).get_page()),
+                         [post])
+
+    @mock.patch('posts.queue.MAX_ATTEMPTS', 2)
+    def test_retries(self):
+        """Упавшая задача откладывается, после MAX_ATTEMPTS - failed."""
+        broken = mock.Mock(side_effect=ValueError('broken'))
+        with mock.patch.dict(TASKS, {'broken': broken}):
+            enqueue('broken', value=1)
+            self.assertEqual(run_pending(), (0, 1))
+            task = Task.objects.get()
+            self.assertGreater(task.run_at, timezone.now())
+            self.assertIn('broken', task.last_error)
+            self.assertEqual(run_pending(), (0, 0))
+
+            Task.objects.update(run_at=timezone.now())
+            self.assertEqual(run_pending(), (0, 1))
+            self.assertTrue(Task.objects.get().failed)
+        broken.assert_called_with(value=1)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'user-cache'}})
+@mock.patch('posts.usercache.transaction.on_commit', lambda func: func())
+class TestUserCache(TestCase):
+    """Класс тестирования кеша пользователей по username."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='skywocker1',
+                                             password='skywockerisjedi')
+
+    def user_queries(self, url, status):
+        """Запросить страницу и вернуть запросы пользователя по username."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status)
+        return [query['sql'] for query in queries
+                if '"auth_user"."username" =' in query['sql']]
+
+    def test_snapshot_and_negative_cache(self):
+        """
+        Тест снимков пользователя.
+
+        Повторный показ профиля и повторный запрос несуществующего
+        пользователя не читают пользователя из базы; регистрация и
+        смена username сбрасывают кеш.
+
+        """
+        url = reverse('profile', args=['skywocker1'])
+        self.assertTrue(self.user_queries(url, 200))
+        self.assertFalse(self.user_queries(url, 200))
+
+        missing = reverse('profile', args=['skywocker2'])
+        self.assertTrue(self.user_queries(missing, 404))
+        self.assertFalse(self.user_queries(missing, 404))
+        User.objects.create_user(username='skywocker2')
+        self.user_queries(missing, 200)
+
+        self.user.username = 'skywocker3'
+        self.user.save()
+        self.user_queries(url, 404)
+        self.user_queries(reverse('profile', args=['skywocker3']), 200)
+
+    def test_session_user(self):
+        """
+        Тест кеша вошедшего пользователя.
+
+        Повторный запрос не читает ни сессию, ни пользователя из базы;
+        смена пароля сбрасывает снимок и разлогинивает сессию.
+
+        """
+        self.client.force_login(self.user)
+        url = reverse('follow_index')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'].username, 'skywocker1')
+        self.assertFalse([query['sql'] for query in queries
+                          if re.search(r'FROM "(auth_user|django_session)"',
+                                       query['sql'])])
+
+        self.user.set_password('skywockerisnotjedi')
+        self.user.save()
+        response = self.client.get(url)
+        self.assertRedirects(response, f"{reverse('login')}?next={url}")
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'page-cache'}})
+@RUN_ON_COMMIT
+class TestPageCache(TestCase):
+    """Класс тестирования кеша страниц для анонимов."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='skywocker1',
+                                             password='skywockerisjedi')
+        self.post = Post.objects.create(text='Первый пост',
+                                        author=self.user)
+
+    def test_anonymous_page(self):
+        """
+        Тест кеша целой страницы.
+
+        Повторный запрос анонима отдается из кеша без запросов к базе,
+        с заголовками для обратного прокси; по ETag отдается 304, а
+        новый пост делает страницу недействительной.
+
+        """
+        url = reverse('index')
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+        self.assertFalse(queries)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('public', second['Cache-Control'])
+        self.assertIn('Cookie', second['Vary'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        Post.objects.create(text='Второй пост', author=self.user)
+        response = self.client.get(url)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertContains(response, 'Второй пост')
+
+    def test_authenticated_bypass(self):
+        """Вошедший пользователь не получает страницу из кеша анонимов."""
+        url = reverse('post_view', args=['skywocker1', self.post.id])
+        self.client.get(url)
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.has_header('ETag'))
+        self.assertContains(response, 'Добавить комментарий')
+
+    def test_rename_group_and_author(self):
+        """
+        Тест переименования группы и автора.
+
+        Название группы и username автора видны в карточках главной,
+        группы и поста и в ответах API; после переименования их видят
+        и аноним, и вошедший пользователь, а ETag API меняются.
+
+        """
+        group = Group.objects.create(title='OldTitle', slug='old')
+        self.post.group = group
+        self.post.save()
+        reader = User.objects.create_user(username='skywocker2')
+        logged = Client()
+        logged.force_login(reader)
+        urls = [reverse('index'), reverse('group_view', args=['old']),
+                reverse('post_view', args=['skywocker1', self.post.id])]
+        api_urls = [reverse('api_index'), reverse('api_group', args=['old'])]
+        for client in (self.client, logged):
+            for url in urls:
+                self.assertContains(client.get(url), 'OldTitle')
+        etags = [self.client.get(url)['ETag'] for url in api_urls]
+
+        group.title = 'NewTitle'
+        group.save()
+        for client in (self.client, logged):
+            for url in urls:
+                self.assertContains(client.get(url), 'NewTitle')
+        renamed = [self.client.get(url)['ETag'] for url in api_urls]
+        self.assertNotEqual(renamed[0], etags[0])
+
+        self.user.username = 'skywocker_renamed'
+        self.user.save()
+        self.assertContains(self.client.get(urls[0]), '@skywocker_renamed')
+        self.assertContains(logged.get(urls[1]), '@skywocker_renamed')
+        for url, etag in zip(api_urls, renamed):
+            response = self.client.get(url)
+            self.assertNotEqual(response['ETag'], etag)
+            self.assertContains(response, 'skywocker_renamed')
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'holes'}})
+class TestHoles(TestCase):
+    """Класс тестирования вставок для читателя в общие страницы."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        cache.clear()
+        self.author = User.objects.create_user(username='skywocker1',
+                                               password='skywockerisjedi')
+        self.reader = User.objects.create_user(username='skywocker2',
+                                               password='skywockerisjedi')
+        self.post = Post.objects.create(text='Общий пост',
+                                        author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_profile_and_post(self):
+        """
+        Тест дырявого кеша.
+
+        Профиль и пост отрисовываются один раз на всех читателей, а
+        кнопка подписки и ссылка на редактирование у каждого свои.
+
+        """
+        profile = reverse('profile', args=['skywocker1'])
+        response = self.author_client.get(profile)
+        self.assertContains(response, 'Редактировать')
+        self.assertContains(response, 'Подписаться')
+        with self.assertTemplateNotUsed('post_item.html'):
+            response = self.reader_client.get(profile)
+        self.assertNotContains(response, 'Редактировать')
+        self.assertContains(response, 'Отписаться')
+        self.assertNotContains(response, '<!--hole:')
+
+        post = reverse('post_view', args=['skywocker1', self.post.id])
+        self.assertContains(self.author_client.get(post), 'Редактировать')
+        with self.assertTemplateNotUsed('post_item.html'):
+            response = self.reader_client.get(post)
+        self.assertNotContains(response, 'Редактировать')
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class TestCommentPages(TestCase):
+    """Класс тестирования постраничных комментариев."""
+
+    def setUp(self):
+        """Подготовка тестового окружения."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='skywocker1',
+                                             password='skywockerisjedi')
+        self.post = Post.objects.create(text='Вирусный пост',
+                                        author=self.user)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'comment_{i}')
+            for i in range(COMMENTS_PER_PAGE * 2 + 5))
+
+    def test_first_page_and_more(self):
+        """
+        Тест догрузки комментариев.
+
+        Пост показывает не больше COMMENTS_PER_PAGE комментариев, а
+        остальные отдаются страницами по курсору до последней. В
+        контексте остается один ленивый QuerySet post_comments.
+
+        """
+        response = self.client.get(
+            reverse('post_view', args=['skywocker1', self.post.id]))
+        html = response.content.decode()
+        self.assertEqual(html.count('name="comment_'), COMMENTS_PER_PAGE)
+        self.assertContains(response, 'Показать еще')
+        self.assertNotIn('comments', response.context[0])
+
+        url = reverse('post_comments_more', args=['skywocker1', self.post.id])
+        cursor = re.search(r'data-cursor="([^"]+)"', html).group(1)
+        seen = re.findall(r'name="comment_(\d+)"', html)
+        while cursor:
+            data = self.client.get(url, {'cursor': cursor}).json()
+            seen += re.findall(r'name="comment_(\d+)"', data['html'])
+            cursor = data['next']
+        self.assertEqual(len(set(seen)), Comment.objects.count())
+
+        response = self.client.get(
+            reverse('post_comments_more', args=['skywocker1', 0]))
+        self.assertEqual(response.status_code, 404)
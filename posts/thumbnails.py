@@ -0,0 +1,60 @@
+"""Фоновая подготовка миниатюр картинок постов."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from posts.queue import enqueue, is_eager
+from sorl.thumbnail import get_thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Размеры миниатюр, которые используются в шаблонах ({% thumbnail %} в
+# post_item.html). При изменении шаблонов список нужно обновить.
+THUMBNAIL_GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+THUMBNAIL_WORKERS = getattr(settings, 'THUMBNAIL_WORKERS', 2)
+
+_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS,
+                               thread_name_prefix='thumbnails')
+
+
+def generate_thumbnails(name):
+    """Сгенерировать все миниатюры картинки name из хранилища."""
+    try:
+        for geometry, options in THUMBNAIL_GEOMETRIES:
+            get_thumbnail(name, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры %s', name)
+        return False
+    return True
+
+
+def generate_in_thread(name):
+    """Сгенерировать миниатюры в потоке пула и закрыть его соединение."""
+    try:
+        return generate_thumbnails(name)
+    finally:
+        # Поток пула держит собственное соединение с базой (хранилище
+        # ключей sorl), закрываем его после каждой задачи.
+        connection.close()
+
+
+def schedule_thumbnails(post):
+    """
+    Поставить в очередь миниатюры поста.
+
+    Без очереди задач (POSTS_TASKS_EAGER) миниатюры готовятся в пуле
+    потоков после фиксации транзакции. Посты с готовыми производными
+    картинки (см. posts.images) миниатюр не требуют.
+
+    """
+    if post.image and not post.image_derivatives:
+        name = post.image.name
+        if not is_eager():
+            enqueue('generate_thumbnails', name=name)
+            return
+        transaction.on_commit(
+            lambda: _executor.submit(generate_in_thread, name))
@@ -0,0 +1,159 @@
+"""Материализованная лента подписок (fan-out on write)."""
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import models
+
+from posts.paginator import NEXT, POSTS_PER_PAGE, CursorPaginator, keyset
+
+# Сколько последних постов хранится в ленте одного пользователя.
+TIMELINE_LENGTH = getattr(settings, 'TIMELINE_LENGTH', 1000)
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а читаются при показе ленты (fan-out on read).
+TIMELINE_FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+
+
+def is_fanout_author(author_id):
+    """Раскладываются ли посты автора по лентам подписчиков."""
+    stats_model = django_apps.get_model('posts', 'UserStats')
+    return not stats_model.objects.filter(
+        user_id=author_id,
+        followers_count__gt=TIMELINE_FANOUT_LIMIT).exists()
+
+
+def fan_out(post):
+    """
+    Добавить новый пост в ленты подписчиков автора.
+
+    Ленты здесь не обрезаются: это два запроса на каждого подписчика.
+    Лишние записи удаляет периодический trim_timelines.
+
+    """
+    if not is_fanout_author(post.author_id):
+        return
+    entry_model = django_apps.get_model('posts', 'TimelineEntry')
+    follow_model = django_apps.get_model('posts', 'Follow')
+    followers = follow_model.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    entry_model.objects.bulk_create(
+        (entry_model(user_id=user_id, post_id=post.pk,
+                     pub_date=post.pub_date)
+         for user_id in followers),
+        batch_size=500, ignore_conflicts=True)
+
+
+def update_fanout(author_id, was_fanout):
+    """
+    Перестроить ленты, если автор перешел через TIMELINE_FANOUT_LIMIT.
+
+    Ставший популярным автор убирается из лент подписчиков: его посты
+    теперь читаются при показе ленты. Вернувшемуся под порог автору
+    ленты подписчиков дозаполняются, иначе пропали бы посты, которые
+    он написал, пока был популярным.
+
+    """
+    is_fanout = is_fanout_author(author_id)
+    if is_fanout == was_fanout:
+        return
+    if not is_fanout:
+        entry_model = django_apps.get_model('posts', 'TimelineEntry')
+        entry_model.objects.filter(post__author_id=author_id).delete()
+        return
+    follow_model = django_apps.get_model('posts', 'Follow')
+    for user_id in follow_model.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True):
+        backfill(user_id, author_id)
+
+
+def backfill(user_id, author_id, apps=django_apps):
+    """Добавить в ленту пользователя последние посты автора."""
+    post_model = apps.get_model('posts', 'Post')
+    entry_model = apps.get_model('posts', 'TimelineEntry')
+    posts = post_model.objects.filter(author_id=author_id).order_by(
+        '-pub_date').values_list('pk', 'pub_date')[:TIMELINE_LENGTH]
+    entry_model.objects.bulk_create(
+        [entry_model(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        batch_size=500, ignore_conflicts=True)
+    trim(user_id, apps)
+
+
+def remove(user_id, author_id):
+    """Убрать из ленты пользователя посты автора."""
+    entry_model = django_apps.get_model('posts', 'TimelineEntry')
+    entry_model.objects.filter(user_id=user_id,
+                               post__author_id=author_id).delete()
+
+
+def trim(user_id, apps=django_apps):
+    """Оставить в ленте пользователя только TIMELINE_LENGTH записей."""
+    entry_model = apps.get_model('posts', 'TimelineEntry')
+    entries = entry_model.objects.filter(user_id=user_id)
+    oldest = entries.order_by('-pub_date', '-post_id').values_list(
+        'pub_date', flat=True)[TIMELINE_LENGTH:TIMELINE_LENGTH + 1]
+    if oldest:
+        entries.filter(pub_date__lte=oldest[0]).delete()
+
+
+def trim_timelines():
+    """Обрезать все ленты длиннее TIMELINE_LENGTH, вернуть их число."""
+    entry_model = django_apps.get_model('posts', 'TimelineEntry')
+    users = entry_model.objects.order_by().values('user_id').annotate(
+        total=models.Count('pk')).filter(
+        total__gt=TIMELINE_LENGTH).values_list('user_id', flat=True)
+    users = list(users)
+    for user_id in users:
+        trim(user_id)
+    return len(users)
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Курсорный пагинатор ленты подписок.
+
+    Посты обычных авторов читаются из материализованной ленты одним
+    проходом по индексу (user, -pub_date, -post). Посты авторов с
+    большим числом подписчиков читаются отдельной ограниченной выборкой
+    на каждого такого автора и сливаются с лентой по (дата, id).
+
+    """
+
+    def __init__(self, user, per_page=POSTS_PER_PAGE):
+        """Лента пользователя user."""
+        post_model = django_apps.get_model('posts', 'Post')
+        super().__init__(post_model.objects.filter(timeline_entries__user=user),
+                         per_page)
+        self.user = user
+
+    def fetch(self, position, direction, limit):
+        """Записи ленты и посты популярных авторов после позиции."""
+        post_model = django_apps.get_model('posts', 'Post')
+        entry_model = django_apps.get_model('posts', 'TimelineEntry')
+        follow_model = django_apps.get_model('posts', 'Follow')
+        popular = list(follow_model.objects.filter(
+            user=self.user,
+            author__stats__followers_count__gt=TIMELINE_FANOUT_LIMIT,
+        ).values_list('author_id', flat=True))
+        # Записи популярных авторов, оставшиеся с тех пор, когда они были
+        # под порогом, не читаются: их посты придут выборкой по автору.
+        entries = entry_model.objects.filter(user=self.user).exclude(
+            post__author_id__in=popular).select_related(
+            'post__author', 'post__group')
+        rows = [entry.post for entry in keyset(
+            entries, 'pub_date', 'post_id', position, direction)[:limit]]
+        for author_id in popular:
+            posts = post_model.objects.feed().filter(author_id=author_id)
+            rows += keyset(posts, 'pub_date', 'pk', position,
+                           direction)[:limit]
+        rows.sort(key=lambda post: (post.pub_date, post.pk),
+                  reverse=direction == NEXT)
+        return rows[:limit]
+
+
+def rebuild_timelines(apps=django_apps):
+    """Заполнить ленты по существующим подпискам."""
+    follow_model = apps.get_model('posts', 'Follow')
+    follows = list(follow_model.objects.exclude(
+        author__stats__followers_count__gt=TIMELINE_FANOUT_LIMIT,
+    ).values_list('user_id', 'author_id'))
+    for user_id, author_id in follows:
+        backfill(user_id, author_id, apps)
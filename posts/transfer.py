@@ -0,0 +1,246 @@
+"""Потоковый экспорт и импорт данных постов в формате JSONL."""
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+from django.core.files.storage import default_storage
+from django.core.management.base import CommandError
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from posts.images import derivative_names
+from posts.models import Comment, Follow, Group, Post, User
+
+# Модели в порядке зависимостей и выгружаемые поля. Пользователи
+# передаются по username, поля *__username при импорте превращаются в id.
+EXPORT_FIELDS = {
+    'group': (Group, ('id', 'title', 'slug', 'description')),
+    'post': (Post, ('id', 'text', 'pub_date', 'updated', 'author__username',
+                    'group_id', 'image', 'image_width', 'image_height',
+                    'image_derivatives')),
+    'comment': (Comment, ('id', 'post_id', 'author__username', 'text',
+                          'created')),
+    'follow': (Follow, ('id', 'user__username', 'author__username')),
+}
+DATE_FIELDS = ('pub_date', 'updated', 'created')
+# Ссылки на строки экспорта, id которых при импорте заменяются на новые.
+REFERENCES = {'group_id': 'group', 'post_id': 'post'}
+
+
+def export_rows(chunk_size):
+    """Строки всех моделей по порядку, без загрузки таблиц в память."""
+    for label, (model, fields) in EXPORT_FIELDS.items():
+        rows = model.objects.order_by('pk').values(*fields)
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield label, row
+
+
+def to_line(label, row):
+    """Строка JSONL для строки модели, даты с микросекундами."""
+    for key in DATE_FIELDS:
+        if row.get(key):
+            row[key] = row[key].isoformat()
+    return json.dumps({'model': label, 'fields': row},
+                      cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def throughput(counts, elapsed):
+    """Строки отчета о числе строк по моделям и скорости."""
+    total = sum(counts.values())
+    lines = [f'{label}: {count}' for label, count in counts.items()]
+    lines.append(f'Всего {total} строк за {elapsed:.2f} с, '
+                 f'{total / max(elapsed, 1e-6):.0f} строк/с.')
+    return lines
+
+
+def image_names(row):
+    """Файлы хранилища, на которые ссылается строка поста."""
+    if not row.get('image'):
+        return []
+    return [row['image'], *derivative_names(
+        row.get('image_derivatives') or '')]
+
+
+def copy_to_dir(names, media_dir):
+    """Скопировать файлы хранилища в каталог media_dir."""
+    for name in names:
+        if not default_storage.exists(name):
+            continue
+        target = os.path.join(media_dir, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with default_storage.open(name) as source, \
+                open(target, 'wb') as destination:
+            shutil.copyfileobj(source, destination)
+
+
+def copy_from_dir(names, media_dir):
+    """Скопировать файлы из каталога media_dir в хранилище."""
+    for name in names:
+        source = os.path.join(media_dir, name)
+        if os.path.exists(source) and not default_storage.exists(name):
+            with open(source, 'rb') as file:
+                default_storage.save(name, file)
+
+
+@contextmanager
+def keep_dates(*models):
+    """Не подставлять текущее время в auto_now поля при вставке."""
+    changed = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(
+                    field, 'auto_now_add', False):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    """
+    Пакетная вставка строк экспорта через bulk_create.
+
+    Строкам выдаются новые id после наибольшего в базе, а ссылки между
+    ними переводятся по словарям старый id -> новый, поэтому загрузка в
+    непустую базу не задевает уже существующие строки. Группа с тем же
+    slug и уже существующая подписка не создаются повторно.
+
+    """
+
+    def __init__(self, batch_size, media_dir=None):
+        """Запоминаем размер пакета и каталог с картинками."""
+        self.batch_size = batch_size
+        self.media_dir = media_dir
+        self.buffers = {label: [] for label in EXPORT_FIELDS}
+        self.counts = dict.fromkeys(EXPORT_FIELDS, 0)
+        # Старые id запоминаются только у моделей, на которые ссылаются
+        # другие строки, поэтому память не растет с числом комментариев
+        # и подписок.
+        self.ids = {label: {} for label in REFERENCES.values()}
+        self.users = {}
+
+    def add(self, line):
+        """Добавить строку JSONL, при заполнении пакета записать его."""
+        record = json.loads(line)
+        label = record['model']
+        self.buffers[label].append(record['fields'])
+        # Пакеты пишутся в порядке файла: строки модели идут после строк
+        # моделей, от которых она зависит.
+        for previous in EXPORT_FIELDS:
+            if previous == label:
+                break
+            self.flush(previous)
+        if len(self.buffers[label]) >= self.batch_size:
+            self.flush(label)
+
+    def resolve_users(self, rows):
+        """Заменить username на id, создав недостающих пользователей."""
+        names = {value for row in rows for key, value in row.items()
+                 if key.endswith('__username') and value is not None}
+        names -= set(self.users)
+        if names:
+            self.users.update(User.objects.filter(
+                username__in=names).values_list('username', 'pk'))
+            missing = names - set(self.users)
+            if missing:
+                new_users = [User(username=name) for name in missing]
+                for user in new_users:
+                    user.set_unusable_password()
+                User.objects.bulk_create(new_users)
+                self.users.update(User.objects.filter(
+                    username__in=missing).values_list('username', 'pk'))
+        for row in rows:
+            for key in [key for key in row if key.endswith('__username')]:
+                # У старых комментариев автора может не быть.
+                name = row.pop(key)
+                row[key[:-len('__username')] + '_id'] = (
+                    None if name is None else self.users[name])
+
+    def resolve_references(self, label, rows):
+        """Перевести ссылки на группы и посты на их новые id."""
+        for row in rows:
+            for key, target in REFERENCES.items():
+                if row.get(key) is None:
+                    continue
+                try:
+                    row[key] = self.ids[target][row[key]]
+                except KeyError:
+                    raise CommandError(
+                        f'{label} id={row["id"]} ссылается на {target} '
+                        f'id={row[key]}, которого нет в файле.')
+
+    def skip_existing(self, label, rows):
+        """Убрать строки, которые уже есть в базе под другим id."""
+        if label == 'group':
+            existing = dict(Group.objects.filter(
+                slug__in=[row['slug'] for row in rows]).values_list(
+                    'slug', 'pk'))
+            for row in rows:
+                if row['slug'] in existing:
+                    self.ids[label][row['id']] = existing[row['slug']]
+            return [row for row in rows if row['slug'] not in existing]
+        if label == 'follow':
+            existing = set(Follow.objects.filter(
+                user_id__in=[row['user_id'] for row in rows]).values_list(
+                    'user_id', 'author_id'))
+            return [row for row in rows
+                    if (row['user_id'], row['author_id']) not in existing]
+        return rows
+
+    def assign_ids(self, label, rows):
+        """
+        Выдать строкам id после наибольшего в базе.
+
+        Вызывается в транзакции вставки, чтобы новые id не пересеклись
+        с чужими.
+
+        """
+        model = EXPORT_FIELDS[label][0]
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        ids = self.ids.get(label)
+        for new_id, row in enumerate(rows, last + 1):
+            if ids is not None:
+                ids[row['id']] = new_id
+            row['id'] = new_id
+
+    def flush(self, label):
+        """Записать накопленный пакет модели одной транзакцией."""
+        rows = self.buffers[label]
+        if not rows:
+            return
+        model = EXPORT_FIELDS[label][0]
+        self.resolve_users(rows)
+        self.resolve_references(label, rows)
+        for row in rows:
+            for key in DATE_FIELDS:
+                if row.get(key):
+                    row[key] = parse_datetime(row[key])
+        if label == 'post' and self.media_dir:
+            for row in rows:
+                copy_from_dir(image_names(row), self.media_dir)
+        try:
+            with transaction.atomic(), keep_dates(model):
+                rows = self.skip_existing(label, rows)
+                self.assign_ids(label, rows)
+                model.objects.bulk_create([model(**row) for row in rows])
+        except IntegrityError as error:
+            raise CommandError(f'Не удалось загрузить {label}: {error}')
+        self.counts[label] += len(rows)
+        self.buffers[label] = []
+
+    def finish(self):
+        """Записать остатки и выровнять последовательности id."""
+        for label in EXPORT_FIELDS:
+            self.flush(label)
+        models = [model for model, fields in EXPORT_FIELDS.values()]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -1,18 +1,29 @@
 """Urls приложения posts."""
 from django.urls import path
 
-from posts import views
+from posts import api, views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('api/v1/', api.index, name='api_index'),
+    path('api/v1/group/<slug:slug>/', api.group_posts, name='api_group'),
+    path('api/v1/follow/', api.follow_index, name='api_follow_index'),
+    path('api/v1/<username>/', api.profile, name='api_profile'),
+    path('api/v1/<username>/<int:post_id>/', api.post_view,
+         name='api_post_view'),
     path('new/', views.new_post, name='new_post'),
     path('group/<slug:slug>/', views.group_posts, name='group_view'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('metrics/slow/', views.slow_requests, name='slow_requests'),
     path('<username>/follow/', views.profile_follow, name='profile_follow'),
     path('<username>/unfollow/', views.profile_unfollow,
          name='profile_unfollow'),
     path('<username>/', views.profile, name='profile'),
     path('<username>/<int:post_id>/', views.post_view, name='post_view'),
+    path('<username>/<int:post_id>/comments/', views.post_comments_more,
+         name='post_comments_more'),
     path('<username>/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('<username>/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
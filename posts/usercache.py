@@ -0,0 +1,99 @@
+"""Кеш пользователей: авторы по username и вошедшие пользователи."""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
+from django.utils.crypto import constant_time_compare
+
+from posts.cache import CACHE_TIMEOUT
+from posts.models import User
+
+# Поля, которые нужны страницам; остальные поля снимка отложены и при
+# обращении будут прочитаны из базы.
+SNAPSHOT_FIELDS = ('id', 'username', 'first_name', 'last_name', 'is_active')
+# Сколько помнить, что пользователя нет, чтобы перебор адресов не ходил
+# в базу. Запись сбрасывается при регистрации пользователя.
+NEGATIVE_TIMEOUT = getattr(settings, 'POSTS_USER_NEGATIVE_TIMEOUT', 60)
+NOT_FOUND = ()
+# Поля вошедшего пользователя: кроме показа нужны права персонала.
+# Model.from_db ждет значения в порядке полей модели, поэтому порядок
+# здесь тот же, что в таблице auth_user.
+AUTH_FIELDS = ('id', 'is_superuser', 'username', 'first_name', 'last_name',
+               'email', 'is_staff', 'is_active')
+
+
+def user_key(username):
+    """Ключ снимка пользователя."""
+    return f'posts:user:{username}'
+
+
+def get_user_or_404(username, queryset=None):
+    """
+    Пользователь по username из кеша или из базы.
+
+    Из кеша возвращается снимок с полями SNAPSHOT_FIELDS. При промахе
+    пользователь читается через queryset (например, с select_related),
+    а в кеш кладутся только поля снимка. Отсутствующий username тоже
+    кешируется на NEGATIVE_TIMEOUT секунд. Запись в кеш откладывается
+    до фиксации транзакции, чтобы не запомнить откатанные данные.
+
+    """
+    key = user_key(username)
+    values = cache.get(key)
+    if values == NOT_FOUND:
+        raise Http404('Пользователь не найден.')
+    if values is not None:
+        return User.from_db(DEFAULT_DB_ALIAS, SNAPSHOT_FIELDS, values)
+    queryset = User.objects.all() if queryset is None else queryset
+    user = queryset.filter(username=username).first()
+    if user is None:
+        transaction.on_commit(
+            lambda: cache.set(key, NOT_FOUND, NEGATIVE_TIMEOUT))
+        raise Http404('Пользователь не найден.')
+    values = tuple(getattr(user, name) for name in SNAPSHOT_FIELDS)
+    transaction.on_commit(lambda: cache.set(key, values, CACHE_TIMEOUT))
+    return user
+
+
+def auth_key(user_id):
+    """Ключ снимка вошедшего пользователя."""
+    return f'posts:auth:{user_id}'
+
+
+def get_cached_user(request):
+    """
+    Пользователь сессии из кеша, без чтения auth_user.
+
+    В кеше рядом со снимком лежит хеш сессии пользователя
+    (get_session_auth_hash). Снимок отдается, только если с ним совпал
+    хеш из сессии, поэтому смена пароля, как и в auth.get_user,
+    разлогинивает прежние сессии. Иначе пользователь загружается и
+    проверяется стандартным auth.get_user.
+
+    """
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    cached = cache.get(auth_key(user_id))
+    if (cached is not None and session_hash
+            and backend_path in settings.AUTHENTICATION_BACKENDS
+            and constant_time_compare(session_hash, cached[0])):
+        return User.from_db(DEFAULT_DB_ALIAS, AUTH_FIELDS, cached[1])
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        entry = (user.get_session_auth_hash(),
+                 tuple(getattr(user, name) for name in AUTH_FIELDS))
+        transaction.on_commit(lambda: cache.set(auth_key(user.pk), entry,
+                                                CACHE_TIMEOUT))
+    return user
+
+
+def forget_user(user_id, *usernames):
+    """Сбросить снимки и отрицательные записи пользователя."""
+    cache.delete_many([auth_key(user_id)] + [
+        user_key(username) for username in usernames if username])
@@ -1,35 +1,114 @@
 """Файл views для приложения posts."""
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.shortcuts import get_object_or_404, redirect, render
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_safe
 
+from posts.cache import (
+    ALL_POSTS,
+    author_scope,
+    cache_anonymous,
+    cache_context,
+    group_scope,
+    post_scope
+)
 from posts.forms import CommentForm, PostForm
+from posts.holes import render
+from posts.metrics import registry
 from posts.models import Follow, Group, Post, User
+from posts.paginator import POSTS_PER_PAGE, CursorPaginator, comments_page
+from posts.replicas import pin_primary, use_replica
+from posts.search import search_post_ids
+from posts.thumbnails import schedule_thumbnails
+from posts.timeline import TimelinePaginator
+from posts.usercache import get_user_or_404
 
 
+def paginate(request, post_list):
+    """Страница ленты по курсору из ?cursor= и пагинатор для шаблона."""
+    page = CursorPaginator(post_list).get_page(request.GET.get('cursor'))
+    return {'page': page, 'paginator': page.paginator}
+
+
+def index_scopes(request):
+    """Области кеша главной страницы."""
+    return [ALL_POSTS]
+
+
+def group_scopes(request, slug):
+    """Области кеша страницы группы."""
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True).first()
+    return None if group_id is None else [group_scope(group_id)]
+
+
+def profile_scopes(request, username):
+    """Области кеша профиля."""
+    try:
+        return [author_scope(get_user_or_404(username).id)]
+    except Http404:
+        return None
+
+
+def post_scopes(request, username, post_id):
+    """Области кеша страницы поста."""
+    try:
+        author_id = get_user_or_404(username).id
+    except Http404:
+        return None
+    return [author_scope(author_id), post_scope(post_id)]
+
+
+@cache_anonymous(index_scopes)
+@use_replica
 def index(request):
     """Страница индекс."""
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.feed()
     return render(request, 'index.html',
-                  {'page': page, 'paginator': paginator})
+                  {**paginate(request, post_list),
+                   **cache_context(ALL_POSTS)})
 
 
+@cache_anonymous(group_scopes)
+@use_replica
 def group_posts(request, slug):
     """Страница для группы."""
     group = get_object_or_404(Group, slug=slug)
-    posts = group.group_posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'group.html', {'group': group,
-                                          'page': page,
-                                          'paginator': paginator})
+    posts = group.group_posts.feed()
+    return render(request, 'group.html',
+                  {'group': group,
+                   **paginate(request, posts),
+                   **cache_context(group_scope(group.id))})
+
+
+@use_replica
+def search(request):
+    """Страница поиска по постам и комментариям."""
+    query = request.GET.get('q', '').strip()
+    try:
+        number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        number = 1
+    ids = search_post_ids(query, POSTS_PER_PAGE + 1,
+                          (number - 1) * POSTS_PER_PAGE)
+    has_next = len(ids) > POSTS_PER_PAGE
+    ids = ids[:POSTS_PER_PAGE]
+    found = Post.objects.feed().in_bulk(ids)
+    page = Page([found[pk] for pk in ids if pk in found], number,
+                Paginator(Post.objects.none(), POSTS_PER_PAGE))
+    return render(request, 'search.html',
+                  {'query': query,
+                   'page': page,
+                   'has_next': has_next})
 
 
 @login_required
+@pin_primary
+@transaction.atomic
 def new_post(request):
     """Создание нового поста."""
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -37,52 +116,72 @@ def new_post(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        schedule_thumbnails(post)
         return redirect('index')
     return render(request, 'new_post.html', {'form': form})
 
 
+@cache_anonymous(profile_scopes)
+@use_replica
 def profile(request, username):
     """Страница для профиля."""
-    author = get_object_or_404(User, username=username)
-    post_list = author.author_posts.all()
-    if request.user.is_anonymous:
-        is_follow = False
-    else:
-        is_follow = Follow.objects.filter(author=author,
-                                          user=request.user).exists()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    author = get_user_or_404(username, User.objects.select_related('stats'))
+    post_list = author.author_posts.feed()
     return render(request, 'profile.html',
                   {'author': author,
-                   'page': page,
-                   'paginator': paginator,
-                   'is_follow': is_follow,
+                   **paginate(request, post_list),
+                   **cache_context(author_scope(author.id)),
                    })
 
 
+@cache_anonymous(post_scopes)
+@use_replica
 def post_view(request, username, post_id):
     """Страница одного поста."""
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(author.author_posts, id=post_id)
-    post_comments = post.post_comment.all()
+    author = get_user_or_404(username, User.objects.select_related('stats'))
+    post = get_object_or_404(author.author_posts.feed(), id=post_id)
+    post_comments = post.post_comment.select_related('author')
     form = CommentForm()
+    # post_comments остается ленивым QuerySet: первую страницу из него
+    # читает тег first_comments внутри фрагмента комментариев, то есть
+    # только при промахе кеша. Остальные догружает post_comments_more.
     return render(request, 'post.html',
                   {'author': author, 'post': post,
                    'form': form,
-                   'post_comments': post_comments})
+                   'post_comments': post_comments,
+                   **cache_context(author_scope(author.id),
+                                   post_scope(post.id))})
+
+
+@cache_anonymous(post_scopes)
+@require_safe
+@use_replica
+def post_comments_more(request, username, post_id):
+    """Следующая страница комментариев поста: HTML карточек и курсор."""
+    author = get_user_or_404(username)
+    post = get_object_or_404(author.author_posts, id=post_id)
+    page = comments_page(post.post_comment.select_related('author'),
+                         request.GET.get('cursor'))
+    return JsonResponse({
+        'html': render_to_string('comment_items.html', {'comments': page},
+                                 request),
+        'next': page.next_cursor,
+    })
 
 
 @login_required
+@pin_primary
 def post_edit(request, username, post_id):
     """Страница редактирования поста."""
-    author = get_object_or_404(User, username=username)
+    author = get_user_or_404(username)
     post = get_object_or_404(author.author_posts, id=post_id)
     if request.user == author:
         form = PostForm(request.POST or None, files=request.FILES or None,
                         instance=post)
         if form.is_valid():
-            form.save()
+            post = form.save()
+            if 'image' in form.changed_data:
+                schedule_thumbnails(post)
             return redirect('post_view',
                             username=username,
                             post_id=post_id)
@@ -104,9 +203,11 @@ def server_error(request):
 
 
 @login_required
+@pin_primary
+@transaction.atomic
 def add_comment(request, username, post_id):
     """Добавление комментария."""
-    author = get_object_or_404(User, username=username)
+    author = get_user_or_404(username)
     post = get_object_or_404(author.author_posts, id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
@@ -117,28 +218,30 @@ def add_comment(request, username, post_id):
         return redirect('post_view',
                         username=username,
                         post_id=post_id)
+    post_comments = post.post_comment.select_related('author')
     return render(request, 'comments.html',
-                  {'form': form, 'post': post})
+                  {'form': form, 'post': post,
+                   'post_comments': post_comments,
+                   **cache_context(author_scope(author.id),
+                                   post_scope(post.id))})
 
 
 @login_required
+@use_replica
 def follow_index(request):
     """Страница постов подписанных авторов."""
-    user = get_object_or_404(User, username=request.user)
-    follower = user.follower.all().values('author')
-    post_follower = Post.objects.filter(author__in=follower).order_by(
-        '-pub_date')
-    paginator = Paginator(post_follower, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = TimelinePaginator(request.user).get_page(
+        request.GET.get('cursor'))
     return render(request, 'follow.html',
-                  {'page': page, 'paginator': paginator})
+                  {'page': page, 'paginator': page.paginator})
 
 
 @login_required
+@pin_primary
+@transaction.atomic
 def profile_follow(request, username):
     """Подписка на автора."""
-    author = get_object_or_404(User, username=username)
+    author = get_user_or_404(username)
     if request.user != author:
         Follow.objects.get_or_create(user_id=request.user.id,
                                      author_id=author.id)
@@ -146,10 +249,26 @@ def profile_follow(request, username):
 
 
 @login_required
+@pin_primary
+@transaction.atomic
 def profile_unfollow(request, username):
     """Отписка от автора."""
-    author = get_object_or_404(User, username=username)
+    author = get_user_or_404(username)
     follow = Follow.objects.filter(user_id=request.user.id,
                                    author_id=author.id)
     follow.delete()
     return redirect('profile', username=username)
+
+
+@staff_member_required
+def metrics(request):
+    """Метрики запросов в текстовом формате Prometheus."""
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4')
+
+
+@staff_member_required
+def slow_requests(request):
+    """Последние медленные запросы вместе с их SQL."""
+    return JsonResponse({'requests': registry.slow_requests()},
+                        json_dumps_params={'ensure_ascii': False})
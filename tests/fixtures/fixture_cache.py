@@ -0,0 +1,16 @@
+"""Отдельный временный кеш для тестов вместо общего кеша сайта."""
+from yatube.test_runner import temporary_cache
+
+restore_cache = None
+
+
+def pytest_configure(config):
+    """Подменяем кеш до создания тестовой базы."""
+    global restore_cache
+    restore_cache = temporary_cache()
+
+
+def pytest_unconfigure(config):
+    """Возвращаем настоящий кеш и удаляем временный каталог."""
+    if restore_cache is not None:
+        restore_cache()
@@ -0,0 +1,121 @@
+"""
+Бюджеты запросов к базе для страниц из posts/urls.py.
+
+Каждая страница запрашивается на данных, где в ленте 1 и 10 записей
+(и столько же комментариев у поста). Число запросов не должно
+превышать бюджет и не должно расти вместе с числом записей: рост
+означает запрос на каждую карточку, то есть N+1.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Наибольшее число запросов для страницы при холодном кеше, включая
+# сессию, пользователя и SAVEPOINT у view под transaction.atomic.
+QUERY_BUDGETS = {
+    'index': 3,
+    'api_index': 1,
+    'api_group': 3,
+    'api_follow_index': 4,
+    'api_profile': 3,
+    'api_post_view': 2,
+    'new_post': 5,
+    'group_view': 4,
+    'follow_index': 4,
+    'search': 4,
+    'metrics': 2,
+    'slow_requests': 2,
+    'profile_follow': 6,
+    'profile_unfollow': 6,
+    'profile': 5,
+    'post_view': 5,
+    'post_comments_more': 3,
+    'post_edit': 5,
+    'add_comment': 7,
+    'server_error': 3,
+    'page_not_found': 3,
+}
+# Страницы, которые смотрит подписчик автора, а не сам автор.
+FOLLOWER_ROUTES = {'follow_index', 'api_follow_index', 'profile_follow',
+                   'profile_unfollow'}
+STAFF_ROUTES = {'metrics', 'slow_requests'}
+QUERY_PARAMS = {'search': {'q': 'бюджет'}}
+ROW_COUNTS = (1, 10)
+DUMMY_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+class QueryBudget:
+    """Замер числа запросов страниц на данных разного размера."""
+
+    def __init__(self, client, django_user_model):
+        self.client = client
+        self.user_model = django_user_model
+        self.datasets = {}
+
+    def populate(self, rows):
+        """Автор с rows постами в группе, подписчик и rows комментариев."""
+        from posts.models import Comment, Follow, Group, Post
+
+        author = self.user_model.objects.create_user(
+            username=f'budget{rows}_author', is_staff=True)
+        follower = self.user_model.objects.create_user(
+            username=f'budget{rows}_follower')
+        group = Group.objects.create(title=f'Бюджет {rows}',
+                                     slug=f'budget-{rows}',
+                                     description='Бюджет запросов')
+        posts = [Post.objects.create(text=f'бюджет {index}', author=author,
+                                     group=group)
+                 for index in range(rows)]
+        for index in range(rows):
+            Comment.objects.create(post=posts[-1], author=follower,
+                                   text=f'бюджет {index}')
+        Follow.objects.create(user=follower, author=author)
+        kwargs = {'username': author.username, 'post_id': posts[-1].pk,
+                  'slug': group.slug}
+        return author, follower, kwargs
+
+    def url(self, name, kwargs):
+        """Адрес страницы с нужными ей параметрами."""
+        from posts.urls import urlpatterns
+
+        pattern = next(item for item in urlpatterns if item.name == name)
+        return reverse(name, kwargs={key: kwargs[key]
+                                     for key in pattern.pattern.converters})
+
+    def measure(self, name, rows):
+        """Число запросов страницы name на данных из rows записей."""
+        if rows not in self.datasets:
+            self.datasets[rows] = self.populate(rows)
+        author, follower, kwargs = self.datasets[rows]
+        self.client.force_login(
+            follower if name in FOLLOWER_ROUTES else author)
+        url = self.url(name, kwargs)
+        params = QUERY_PARAMS.get(name, {})
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+        return len(queries), [query['sql'] for query in queries]
+
+    def check(self, name):
+        """Проверить бюджет и отсутствие роста запросов для страницы."""
+        budget = QUERY_BUDGETS[name]
+        counts = {}
+        for rows in ROW_COUNTS:
+            counts[rows], queries = self.measure(name, rows)
+            assert counts[rows] <= budget, (
+                f'Страница `{name}` выполняет {counts[rows]} запросов к '
+                f'базе при бюджете {budget}:\n' + '\n'.join(queries))
+        small, large = (counts[rows] for rows in ROW_COUNTS)
+        assert small == large, (
+            f'Число запросов страницы `{name}` растет вместе с числом '
+            f'записей ({small} -> {large}), похоже на N+1:\n'
+            + '\n'.join(queries))
+
+
+@pytest.fixture
+def query_budget(client, django_user_model, settings):
+    settings.CACHES = DUMMY_CACHE
+    return QueryBudget(client, django_user_model)
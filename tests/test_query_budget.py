@@ -0,0 +1,17 @@
+import pytest
+
+from tests.fixtures.fixture_query_budget import QUERY_BUDGETS
+
+
+def test_every_route_has_budget():
+    from posts.urls import urlpatterns
+
+    names = {pattern.name for pattern in urlpatterns}
+    missing = names - set(QUERY_BUDGETS)
+    assert not missing, f'Задайте бюджет запросов для страниц {sorted(missing)}'
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', sorted(QUERY_BUDGETS))
+def test_query_budget(query_budget, name):
+    query_budget.check(name)
@@ -39,7 +39,7 @@ SITE_ID = 1
 
 INSTALLED_APPS = [
     'users',
-    'posts',
+    'posts.apps.PostsConfig',
     'django.contrib.sites',
     'django.contrib.flatpages',
     'django.contrib.admin',
@@ -53,12 +53,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.middleware.MetricsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'posts.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,7 +76,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'posts.metrics.InstrumentedTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -96,11 +98,30 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,
+            'busy_timeout': 5000,
+            'transaction_mode': 'IMMEDIATE',
+            'write_retries': 5,
+            'write_retry_delay': 0.05,
+        },
     }
 }
 
+# Любая дополнительная база считается репликой основной: ленты читаются
+# с нее, а после записи пользователь на время читает с основной базы.
+DATABASE_ROUTERS = ['posts.replicas.ReplicaRouter']
+
+# Побочные эффекты записи (счетчики, ленты, поиск, сброс кеша, миниатюры)
+# в разработке выполняются сразу, в работе - воркером manage.py run_tasks.
+POSTS_TASKS_EAGER = DEBUG
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -158,8 +179,22 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Сессия читается из кеша, база остается надежной копией; пользователь
+# сессии берется из кеша в posts.middleware.CachedAuthenticationMiddleware.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Один файл кеша на хост: все воркеры видят одни и те же фрагменты.
 CACHES = {
         'default': {
-                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'BACKEND': 'posts.metrics.InstrumentedCache',
+                'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+                'OPTIONS': {
+                        'BACKEND': 'yatube.sqlitecache.SQLiteCache',
+                        'MAX_SIZE': 256 * 1024 * 1024,
+                },
         }
 }
+# manage.py test подменяет LOCATION временным каталогом, чтобы не
+# очищать кеш работающего сайта; для pytest это делает
+# tests/fixtures/fixture_cache.py.
+TEST_RUNNER = 'yatube.test_runner.TestRunner'
@@ -0,0 +1,103 @@
+"""
+Бэкенд SQLite с настройками для работы под нагрузкой.
+
+Поверх стандартного бэкенда включает WAL и прагмы производительности,
+открывает транзакции через BEGIN IMMEDIATE и повторяет запросы,
+получившие «database is locked».
+"""
+import time
+
+from django.db.backends.sqlite3 import base
+
+# Значения по умолчанию для ключей OPTIONS, которые понимает бэкенд.
+TUNING_DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение задает размер кеша страниц в килобайтах.
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'transaction_mode': 'IMMEDIATE',
+    'write_retries': 5,
+    'write_retry_delay': 0.05,
+}
+PRAGMAS = ('journal_mode', 'synchronous', 'mmap_size', 'cache_size',
+           'busy_timeout')
+
+
+def is_locked(error):
+    """Ошибка занятости базы другим писателем."""
+    return 'database is locked' in str(error)
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    """Курсор, повторяющий запрос при занятой базе."""
+
+    retries = 0
+    retry_delay = 0
+
+    def _retry(self, method, *args):
+        """Вызвать method, повторяя его с растущей паузой."""
+        for attempt in range(self.retries + 1):
+            try:
+                return method(*args)
+            except base.Database.OperationalError as error:
+                if not is_locked(error) or attempt == self.retries:
+                    raise
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+    def execute(self, query, params=None):
+        """Выполнить запрос с повторами."""
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        """Выполнить пакет запросов с повторами."""
+        return self._retry(super().executemany, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Подключение к SQLite с прагмами из OPTIONS.
+
+    Транзакции начинаются с BEGIN IMMEDIATE: писатель берет блокировку
+    записи сразу, а не при первом INSERT внутри транзакции, поэтому
+    конкурирующие записи выстраиваются в очередь на busy_timeout и не
+    падают посреди транзакции. Читатели в режиме WAL при этом не
+    блокируются.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Отделяем настройки бэкенда от параметров sqlite3.connect."""
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.tuning = {key: options.get(key, default)
+                       for key, default in TUNING_DEFAULTS.items()}
+
+    def get_connection_params(self):
+        """Параметры соединения без ключей настройки."""
+        kwargs = super().get_connection_params()
+        for key in self.tuning:
+            kwargs.pop(key, None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        """Открываем соединение и применяем прагмы."""
+        conn = super().get_new_connection(conn_params)
+        for pragma in PRAGMAS:
+            value = self.tuning[pragma]
+            if value is not None:
+                conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        """Курсор с повторами при занятой базе."""
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.retries = self.tuning['write_retries']
+        cursor.retry_delay = self.tuning['write_retry_delay']
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        """Начать транзакцию в заданном режиме блокировки."""
+        mode = self.tuning['transaction_mode']
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,295 @@
+"""
+Общий для всех процессов хоста кеш в файле SQLite.
+
+В отличие от LocMemCache один файл читают все воркеры, поэтому фрагмент,
+собранный одним процессом, сразу доступен остальным и хранится в одном
+экземпляре. Записи атомарны (транзакция BEGIN IMMEDIATE), файл работает
+в режиме WAL и не блокирует читателей. Объем ограничивается MAX_SIZE
+байт с вытеснением давно не читанных записей.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed);
+CREATE TABLE IF NOT EXISTS cache_size (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_size (id, total) VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entry_insert AFTER INSERT ON cache_entry
+BEGIN
+    UPDATE cache_size SET total = total + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_update
+AFTER UPDATE OF size ON cache_entry
+BEGIN
+    UPDATE cache_size SET total = total + NEW.size - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_delete AFTER DELETE ON cache_entry
+BEGIN
+    UPDATE cache_size SET total = total - OLD.size;
+END;
+"""
+UPSERT = """
+INSERT INTO cache_entry (key, value, expires, size, accessed)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value, expires = excluded.expires,
+    size = excluded.size, accessed = excluded.accessed
+"""
+LOCK_SUFFIX = ':lock'
+
+
+class SQLiteCache(BaseCache):
+    """
+    Бэкенд кеша Django поверх файла SQLite.
+
+    LOCATION - путь к файлу. OPTIONS: MAX_SIZE - предел объема значений
+    в байтах, TOUCH_INTERVAL - как часто (в секундах) чтение обновляет
+    отметку для LRU, LOCK_TIMEOUT - сколько get_or_set ждет значение,
+    которое уже вычисляет другой процесс, BUSY_TIMEOUT - ожидание
+    блокировки записи в секундах.
+
+    """
+
+    _missing = object()
+
+    def __init__(self, location, params):
+        """Запоминаем путь и настройки, соединения открываются лениво."""
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self.touch_interval = options.get('TOUCH_INTERVAL', 10)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 10)
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self.poll_interval = 0.05
+        self._local = threading.local()
+
+    def _connection(self):
+        """Соединение текущего потока; после fork открывается заново."""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path,
+                                         timeout=self.busy_timeout,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.executescript(f'BEGIN IMMEDIATE;{SCHEMA}COMMIT;')
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция записи, сразу берущая блокировку файла."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _store(self, connection, key, value, timeout):
+        """Записать значение внутри транзакции."""
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        connection.execute(UPSERT, (key, data,
+                                    self.get_backend_timeout(timeout),
+                                    len(data), time.time()))
+
+    def _cull(self, connection):
+        """Вытеснить просроченные и давно не читанные записи сверх MAX_SIZE."""
+        total = connection.execute('SELECT total FROM cache_size').fetchone()
+        if total[0] <= self.max_size:
+            return
+        connection.execute('DELETE FROM cache_entry WHERE expires < ?',
+                           (time.time(),))
+        # Освобождаем с запасом, чтобы не вытеснять на каждой записи.
+        target = self.max_size * 0.9
+        total = connection.execute('SELECT total FROM cache_size').fetchone()
+        excess = total[0] - target
+        victims = []
+        rows = connection.execute(
+            'SELECT key, size FROM cache_entry ORDER BY accessed')
+        for key, size in rows:
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        connection.executemany('DELETE FROM cache_entry WHERE key = ?',
+                               victims)
+
+    def _fetch(self, keys):
+        """Живые значения по готовым ключам."""
+        connection = self._connection()
+        now = time.time()
+        found, stale = {}, []
+        placeholders = ', '.join('?' * len(keys))
+        rows = connection.execute(
+            f'SELECT key, value, expires, accessed FROM cache_entry '
+            f'WHERE key IN ({placeholders})', keys)
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            found[key] = pickle.loads(value)
+            if now - accessed > self.touch_interval:
+                stale.append((now, key))
+        if stale:
+            connection.executemany(
+                'UPDATE cache_entry SET accessed = ? WHERE key = ?', stale)
+        return found
+
+    def get(self, key, default=None, version=None):
+        """Прочитать значение."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        """Прочитать несколько значений одним запросом."""
+        made = {}
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            made[made_key] = key
+        if not made:
+            return {}
+        found = self._fetch(list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Записать значение."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._transaction() as connection:
+            self._store(connection, key, value, timeout)
+            self._cull(connection)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        """Записать несколько значений одной транзакцией."""
+        with self._transaction() as connection:
+            for key, value in data.items():
+                key = self.make_key(key, version=version)
+                self.validate_key(key)
+                self._store(connection, key, value, timeout)
+            self._cull(connection)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Записать значение, только если ключа нет или он просрочен."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT expires FROM cache_entry WHERE key = ?',
+                (key,)).fetchone()
+            if row is not None and (row[0] is None or row[0] > time.time()):
+                return False
+            self._store(connection, key, value, timeout)
+            self._cull(connection)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        """Продлить срок жизни значения."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE cache_entry SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()))
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно увеличить число."""
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache_entry WHERE key = ?',
+                (made_key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache_entry SET value = ?, size = ? WHERE key = ?',
+                (data, len(data), made_key))
+        return value
+
+    def delete(self, key, version=None):
+        """Удалить значение."""
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        """Удалить несколько значений."""
+        made = []
+        for key in keys:
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            made.append((key,))
+        with self._transaction() as connection:
+            connection.executemany('DELETE FROM cache_entry WHERE key = ?',
+                                   made)
+
+    def has_key(self, key, version=None):
+        """Есть ли живое значение."""
+        return self.get(key, self._missing, version=version) is not (
+            self._missing)
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Прочитать значение или вычислить его один раз на все процессы.
+
+        Вычисляет тот, кто первым взял блокировку через add, остальные
+        ждут его результат до LOCK_TIMEOUT секунд и только потом
+        вычисляют сами.
+
+        """
+        value = self.get(key, self._missing, version=version)
+        if value is not self._missing:
+            return value
+        if not callable(default):
+            self.add(key, default, timeout=timeout, version=version)
+            return self.get(key, default, version=version)
+        lock = f'{key}{LOCK_SUFFIX}'
+        locked = self.add(lock, 1, timeout=self.lock_timeout,
+                          version=version)
+        if not locked:
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                value = self.get(key, self._missing, version=version)
+                if value is not self._missing:
+                    return value
+        try:
+            value = default()
+            self.set(key, value, timeout=timeout, version=version)
+        finally:
+            if locked:
+                self.delete(lock, version=version)
+        return value
+
+    def clear(self):
+        """Удалить все значения."""
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM cache_entry')
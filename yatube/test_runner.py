@@ -0,0 +1,43 @@
+"""Запуск тестов с отдельным временным кешем."""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def temporary_cache():
+    """
+    Включить кеш в новом временном каталоге, вернуть функцию отката.
+
+    Общий кеш лежит в BASE_DIR/cache.sqlite3 и им пользуются запущенные
+    процессы сайта; тесты его очищают, поэтому работают со своей копией.
+
+    """
+    directory = tempfile.mkdtemp(prefix='yatube-test-cache-')
+    caches = {alias: {**params, 'LOCATION': os.path.join(
+                  directory, os.path.basename(params['LOCATION']))}
+              for alias, params in settings.CACHES.items()}
+    override = override_settings(CACHES=caches)
+    override.enable()
+
+    def restore():
+        override.disable()
+        shutil.rmtree(directory, ignore_errors=True)
+    return restore
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner, которому выдается временный кеш."""
+
+    def setup_test_environment(self, **kwargs):
+        """Подменяем кеш до создания тестовой базы."""
+        super().setup_test_environment(**kwargs)
+        self.restore_cache = temporary_cache()
+
+    def teardown_test_environment(self, **kwargs):
+        """Возвращаем настоящий кеш и удаляем временный каталог."""
+        self.restore_cache()
+        super().teardown_test_environment(**kwargs)